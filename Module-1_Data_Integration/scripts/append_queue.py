@@ -0,0 +1,210 @@
+# scripts/append_queue.py
+"""
+Write-behind queue for row appends.
+
+put(tab, row) returns immediately; rows are grouped per tab and sent as one
+bulk append when a tab reaches max_rows, every interval seconds, or at exit.
+Every row is first written to a local JSONL journal, so rows still buffered
+when the process dies are replayed by the next queue opened on the same
+journal directory (delivery is at-least-once).
+
+Several processes can share a journal directory: each writes its own
+appends-<pid>-<id>.* files and holds an flock on appends-<pid>-<id>.lock while
+it lives. A new queue adopts only the files of owners whose lock it can take.
+"""
+import os
+import json
+import time
+import uuid
+import atexit
+import threading
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): journals of dead processes are not adopted
+    fcntl = None
+
+class AppendQueue:
+    def __init__(self, send, journal_dir, interval=2.0, max_rows=100):
+        """send(tab, rows) performs one bulk append and raises on failure."""
+        self.send = send
+        self.interval = max(0.05, float(interval))
+        self.max_rows = max(1, int(max_rows))
+        self.dir = Path(journal_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()        # buffers + journal
+        self._flushing = threading.Lock()    # one flush at a time
+        self._wake = threading.Event()
+        self._closed = False
+        self._buffers = {}                   # tab -> [(seq, row)]
+        self._seq = 0
+        self._failures = 0                   # consecutive flushes with unsent rows
+        self._prefix = f"appends-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        with self._dir_lock():
+            self._owner = self._hold(self.dir / f"{self._prefix}.lock")
+            self._pending = self._replay()   # journal segments not yet confirmed sent
+        self._journal = open(self._current(), "a", encoding="utf8")
+        self._thread = threading.Thread(target=self._run, name="append-queue", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---- journal
+    def _current(self):
+        return self.dir / f"{self._prefix}.jsonl"
+
+    def _dir_lock(self):
+        """Serialises queue start-up (own lock + adoption) across processes."""
+        dir_lock = self
+        class _Ctx:
+            def __enter__(ctx):
+                ctx.fh = open(dir_lock.dir / "adopt.lock", "a")
+                if fcntl is not None:
+                    fcntl.flock(ctx.fh, fcntl.LOCK_EX)
+            def __exit__(ctx, *exc):
+                ctx.fh.close()  # releases the flock
+        return _Ctx()
+
+    @staticmethod
+    def _hold(path, block=True):
+        """Open `path` and take an exclusive flock on it; None if another process holds it."""
+        fh = open(path, "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | (0 if block else fcntl.LOCK_NB))
+            except BlockingIOError:
+                fh.close()
+                return None
+        return fh
+
+    def _orphans(self):
+        """Journal files of queues whose owner is gone (their lock could be taken)."""
+        if fcntl is None:
+            return []
+        segs = []
+        for lock in sorted(self.dir.glob("appends-*.lock")):
+            prefix = lock.name[:-len(".lock")]
+            if prefix == self._prefix:
+                continue
+            fh = self._hold(lock, block=False)
+            if fh is None:
+                continue  # a live queue
+            segs += sorted(self.dir.glob(f"{prefix}.jsonl")) + sorted(self.dir.glob(f"{prefix}.*.flushing.jsonl"))
+            lock.unlink(missing_ok=True)
+            fh.close()
+        # journals from before per-process files (no lock, written by an older version)
+        segs += sorted(p for p in self.dir.glob("appends*.jsonl") if not p.name.startswith("appends-"))
+        return segs
+
+    def _replay(self):
+        """Load rows left by dead processes; their files are removed after the next flush."""
+        segs = self._orphans()
+        entries = []
+        for seg in segs:
+            with open(seg, encoding="utf8") as fh:
+                for line in fh:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue  # torn last line from a crash
+        entries.sort(key=lambda e: e["seq"])
+        for e in entries:
+            self._buffers.setdefault(e["tab"], []).append((e["seq"], e["row"]))
+        self._seq = entries[-1]["seq"] if entries else 0
+        if entries:
+            print(f"[append_queue] replaying {len(entries)} journaled row(s) from {len(segs)} file(s)")
+            self._wake.set()
+        # take the files over under our own prefix, so a crash now leaves them to the next queue
+        parked = []
+        for i, seg in enumerate(segs):
+            dst = self.dir / f"{self._prefix}.{time.time_ns()}.{i}.flushing.jsonl"
+            os.replace(seg, dst)
+            parked.append(dst)
+        return parked
+
+    def _log(self, tab, items):
+        for seq, row in items:
+            self._journal.write(json.dumps({"seq": seq, "tab": tab, "row": row}, ensure_ascii=False) + "\n")
+        self._journal.flush()
+
+    # ---- producer side
+    def put(self, tab, row):
+        row = list(row)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("append queue is closed")
+            self._seq += 1
+            item = (self._seq, row)
+            self._log(tab, [item])
+            buf = self._buffers.setdefault(tab, [])
+            buf.append(item)
+            if len(buf) >= self.max_rows:
+                self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return sum(len(b) for b in self._buffers.values())
+
+    # ---- consumer side
+    def flush(self):
+        """Send everything buffered now. Returns the number of rows sent."""
+        with self._flushing:
+            with self._lock:
+                batch, self._buffers = self._buffers, {}
+                if not batch:
+                    return 0
+                # rotate: the rows in `batch` live in these files only
+                self._journal.close()
+                seg = self.dir / f"{self._prefix}.{time.time_ns()}.flushing.jsonl"
+                os.replace(self._current(), seg)
+                self._journal = open(self._current(), "a", encoding="utf8")
+                done_files, self._pending = self._pending + [seg], []
+
+            sent, failed = 0, {}
+            for tab, items in batch.items():
+                try:
+                    self.send(tab, [row for _, row in items])
+                    sent += len(items)
+                except Exception as e:
+                    print(f"[append_queue] {tab}: {len(items)} row(s) not sent, will retry ({e})")
+                    failed[tab] = items
+
+            self._failures = self._failures + 1 if failed else 0
+            with self._lock:
+                for tab, items in failed.items():
+                    # re-journal before the old files go, then put back ahead of newer rows
+                    self._log(tab, items)
+                    self._buffers[tab] = items + self._buffers.get(tab, [])
+                for f in done_files:
+                    f.unlink(missing_ok=True)
+            return sent
+
+    def _run(self):
+        while not self._closed:
+            # back off while the target keeps failing (quota), up to 32x the interval
+            self._wake.wait(self.interval * 2 ** min(self._failures, 5))
+            self._wake.clear()
+            if self._closed:
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[append_queue] flush error: {e}")
+
+    def close(self):
+        """Stop the background thread and make a last attempt to send everything."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=self.interval + 5)
+        self.flush()
+        with self._lock:
+            self._journal.close()
+            left = sum(len(b) for b in self._buffers.values())
+        if left:
+            print(f"[append_queue] {left} row(s) kept in {self.dir} for the next run")
+        else:
+            self._current().unlink(missing_ok=True)
+            (self.dir / f"{self._prefix}.lock").unlink(missing_ok=True)
+        self._owner.close()  # unlocked: whatever is left can be adopted
@@ -1,28 +1,57 @@
-import json
-from scripts.utils import (
-    is_english, toxicity, sentiment, hashtags, marketing_signals, hours_since, json_arr
-)
+import re
+import numpy as np
+import pandas as pd
+from scripts.utils import hours_since, json_arr, LEXICON
+from scripts.text_quality import english_mask
+from scripts.signal_matrix import ATTR, build_matrix, signal_matrix, first_seen_order
+from scripts.near_dupes import near_duplicate_groups
 
+# ---- column-at-once versions of the utils text checks (same results as the per-row ones)
+def toxicity_scores(hits):
+    return np.where(hits.any("toxic"), 0.6, 0.05)
+
+def sentiment_scores(hits):
+    return np.where(hits.any("pos"), 0.7, np.where(hits.any("neg"), -0.6, 0.1))
+
+def hashtag_lists(texts):
+    return [sorted({m.lower() for m in re.findall(r"#\w+", t)}) if "#" in t else [] for t in texts]
 
 def engagement_density(row):
     return (row["likes_or_score"] + row["reply_count"] + 5*row["creator_heart_or_awards"]) / max(1.0, hours_since(row["created_utc"]))
 
-def apply_filters(df, platform_name, dq_log):
+def engagement_densities(df, now=None):
+    """engagement_density for every row, timestamps parsed once against a single `now`."""
+    now = pd.Timestamp.now(tz="UTC") if now is None else pd.Timestamp(now)
+    ts = pd.to_datetime(df["created_utc"], utc=True, format="ISO8601")
+    hours = np.maximum(1.0, (now - ts).dt.total_seconds().to_numpy() / 3600)
+    score = (df["likes_or_score"] + df["reply_count"] + 5*df["creator_heart_or_awards"]).to_numpy(dtype="float64")
+    return score / hours
+
+def apply_filters(df, platform_name, dq_log, now=None):
     if df.empty: return df
     df = df[df["text"].astype(str).str.len() > 6].copy()
+    texts = df["text"].astype(str).tolist()
 
-    df["lang"] = df["text"].apply(lambda t: "en" if is_english(t) else "other")
-    dq_log.append((platform_name, "lang_other", int((df["lang"]!="en").sum())))
-    df = df[df["lang"]=="en"]
+    en = english_mask(texts)
+    df["lang"] = np.where(en, "en", "other")
+    dq_log.append((platform_name, "lang_other", int((~en).sum())))
+    df = df[en]
+    texts = [t for t, k in zip(texts, en) if k]
+    # every lexicon in one pass; rows dropped later are just masked out
+    hits = LEXICON.match_many(texts)
 
-    df["toxicity_score"] = df["text"].apply(toxicity)
-    dq_log.append((platform_name, "toxicity_gt_0.30", int((df["toxicity_score"]>0.30).sum())))
-    df = df[df["toxicity_score"]<=0.30]
+    tox = toxicity_scores(hits)
+    df["toxicity_score"] = tox
+    dq_log.append((platform_name, "toxicity_gt_0.30", int((tox>0.30).sum())))
+    keep = tox<=0.30
+    df = df[keep]
+    texts = [t for t, k in zip(texts, keep) if k]
 
-    df["sentiment_score"] = df["text"].apply(sentiment)
-    df["hashtags"] = df["text"].apply(hashtags)
-    df["marketing_signals"] = df["text"].apply(marketing_signals)
-    df["engagement_density"] = df.apply(engagement_density, axis=1)
+    df["sentiment_score"] = sentiment_scores(hits)[keep]
+    df["hashtags"] = pd.Series(hashtag_lists(texts), index=df.index, dtype=object)
+    sigs = hits.lists("signal")
+    df["marketing_signals"] = pd.Series([l for l, k in zip(sigs, keep) if k], index=df.index, dtype=object)
+    df["engagement_density"] = engagement_densities(df, now) if len(df) else np.zeros(0)
 
     dq_log.append((platform_name, "ed_lt_0.20", int((df["engagement_density"]<0.20).sum())))
     df = df[df["engagement_density"]>=0.20]
@@ -31,22 +60,79 @@ def apply_filters(df, platform_name, dq_log):
     dq_log.append((platform_name, "no_signal_or_hashtag", int((~keep).sum())))
     df = df[keep]
 
-    df["hashtags"] = df["hashtags"].apply(json_arr)
-    df["marketing_signals"] = df["marketing_signals"].apply(json_arr)
+    # multi-hot view for KPIs/rollups, built from the lists before they become JSON text
+    m = build_matrix(df.index, df["marketing_signals"].tolist(), df["hashtags"].tolist())
+    df["hashtags"] = df["hashtags"].map(json_arr)
+    df["marketing_signals"] = df["marketing_signals"].map(json_arr)
+    df.attrs[ATTR] = m
     return df
 
-def compute_kpis(df):
+def collapse_near_duplicates(df, platform_name, dq_log):
+    """
+    Run after apply_filters: keep the first row of each near-duplicate group with the
+    group size in dup_count (summing dup_count already there, so collapsing twice is safe).
+    """
+    if df.empty: return df
+    rep = near_duplicate_groups(df["text"].astype(str).tolist())
+    keep = rep == np.arange(len(df))
+    dq_log.append((platform_name, "near_duplicate", int((~keep).sum())))
+    m = df.attrs.get(ATTR)
+    out = df[keep].copy()
+    weights = pd.to_numeric(df["dup_count"]).to_numpy() if "dup_count" in df.columns else None
+    out["dup_count"] = np.bincount(rep, weights=weights, minlength=len(df))[keep].astype("int64")
+    if m is not None and m.aligned(df):
+        out.attrs[ATTR] = m.take(np.flatnonzero(keep))
+    return out
+
+def kpi_partials(df):
+    """
+    Additive KPI inputs for one batch; merge_kpi_partials + finalize_kpis give compute_kpis.
+    A collapsed row counts dup_count times, so near-duplicates still count as comments.
+    """
+    part = dict(n=len(df), pos=0, ed_sum=0.0, sig_rows={}, sig_ed={})
     if df.empty:
+        return part
+    w = (pd.to_numeric(df["dup_count"], errors="coerce").fillna(1).to_numpy(dtype="float64")
+         if "dup_count" in df.columns else np.ones(len(df)))
+    part["n"] = int(w.sum())
+    part["pos"] = int(w[(pd.to_numeric(df["sentiment_score"]) > 0.2).to_numpy()].sum())
+    ed = df["engagement_density"].to_numpy(dtype="float64")
+    part["ed_sum"] = float(ed @ w)
+    m = signal_matrix(df)
+    ST = m.S.T.astype(np.float64)
+    rows = ST @ w
+    sig_ed = ST @ (ed * w)
+    for j in first_seen_order(m):  # dict order = first-seen order, for the top-signal tie-break
+        part["sig_rows"][m.signals[j]] = int(rows[j])
+        part["sig_ed"][m.signals[j]] = float(sig_ed[j])
+    return part
+
+def merge_kpi_partials(parts):
+    """Combine kpi_partials in order (signal first-seen order breaks ties for the top signal)."""
+    out = dict(n=0, pos=0, ed_sum=0.0, sig_rows={}, sig_ed={})
+    for p in parts:
+        out["n"] += p["n"]; out["pos"] += p["pos"]; out["ed_sum"] += p["ed_sum"]
+        for s, c in p["sig_rows"].items():
+            out["sig_rows"][s] = out["sig_rows"].get(s, 0) + c
+            out["sig_ed"][s] = out["sig_ed"].get(s, 0.0) + p["sig_ed"][s]
+    return out
+
+def finalize_kpis(part):
+    if not part["n"]:
         return dict(total=0, pos=0.0, top="n/a", top_score=0.0, avg_ed=0.0)
-    pos = float((df["sentiment_score"]>0.2).mean())
-    tmp = df.copy()
-    tmp["marketing_signals"] = tmp["marketing_signals"].apply(lambda s: json.loads(s))
-    sigs = tmp.explode("marketing_signals").dropna(subset=["marketing_signals"])
-    top = sigs["marketing_signals"].value_counts().index[0] if not sigs.empty else "n/a"
-    if top != "n/a":
-        top_mask = tmp["marketing_signals"].apply(lambda L: top in L)
-        top_score = float(tmp.loc[top_mask, "engagement_density"].mean())
-    else:
-        top_score = 0.0
-    avg_ed = float(df["engagement_density"].mean())
-    return dict(total=len(df), pos=round(pos,3), top=top, top_score=round(top_score,3), avg_ed=round(avg_ed,3))
+    top, top_score = "n/a", 0.0
+    if part["sig_rows"]:
+        top = max(part["sig_rows"], key=part["sig_rows"].get)  # first-seen wins a tie
+        top_score = part["sig_ed"][top] / part["sig_rows"][top]
+    return dict(total=part["n"], pos=round(part["pos"]/part["n"],3), top=top,
+                top_score=round(top_score,3), avg_ed=round(part["ed_sum"]/part["n"],3))
+
+def compute_kpis(df):
+    return finalize_kpis(kpi_partials(df))
+
+def merge_dq_log(dq_log):
+    """Sum (platform, reason, count) entries from several batches, first-seen order kept."""
+    totals = {}
+    for platform, reason, count in dq_log:
+        totals[(platform, reason)] = totals.get((platform, reason), 0) + int(count)
+    return [(p, r, c) for (p, r), c in totals.items()]
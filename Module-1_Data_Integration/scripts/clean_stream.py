@@ -0,0 +1,271 @@
+# scripts/clean_stream.py
+"""
+Out-of-core cleaning of raw snapshot history.
+
+Reads raw_<platform>_<date>.jsonl[.gz|.zst] files CLEAN_CHUNK_ROWS rows at a
+time, runs apply_filters on each chunk and appends the kept rows straight to
+data/clean_<platform>.csv, so peak memory is one chunk per worker however
+much history is replayed. The dq_log counters of all chunks are summed into
+data/data_quality_log.csv and KPIs per platform go to data/kpi.csv.
+
+Near-duplicates are collapsed once per platform over the merged clean CSV
+(NEAR_DUP_THRESHOLD=0 skips it), since copies of a comment usually sit in
+different snapshots. That pass streams the CSV twice in chunks: the first
+groups rows through a near_dupes.NearDupIndex (MinHash signatures of the
+newest NEAR_DUP_MAX_GROUPS groups), spilling a keep flag per row to a side
+file and counting only the rows folded into each group; the second rewrites
+the kept rows with dup_count. Memory is bounded by the index window and the
+number of groups that have copies, not by the length of the history. KPIs count every clean comment, near-duplicates included.
+
+With --from-archive (CLEAN_FROM_ARCHIVE=1) the raw rows come from the Parquet
+archive instead, one platform/day partition per job. The final clean rows are
+archived as the "clean" kind, by created_utc day, replacing the days written
+(CLEAN_ARCHIVE=0 skips it).
+
+Each snapshot file (one platform-day) is a partition. With --workers N the
+partitions run on a process pool, each writing its own shard; shards, dq_log
+and KPI partials are then merged in input order, so the output does not
+depend on the number of workers or on which partition finishes first.
+
+    python -m scripts.clean_stream data/raw/raw_*.jsonl.gz
+    python -m scripts.clean_stream --workers 8 --now 2025-12-16T00:00:00Z scripts/data/raw/*.jsonl
+    python -m scripts.clean_stream --from-archive
+"""
+import os, re, glob, time, shutil, argparse, datetime as dt
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scripts.clean_and_signals import (
+    apply_filters, merge_dq_log, kpi_partials, merge_kpi_partials, finalize_kpis,
+)
+from scripts import near_dupes
+
+DATA = os.getenv("CLEAN_OUT_DIR", "data")
+CHUNK_ROWS = int(os.getenv("CLEAN_CHUNK_ROWS", "20000"))
+WORKERS = max(1, int(os.getenv("CLEAN_WORKERS", "1")))
+LABELS = {"youtube": "YouTube", "reddit": "Reddit"}
+SNAPSHOT_RE = re.compile(r"raw_(youtube|reddit)_")
+FROM_ARCHIVE = os.getenv("CLEAN_FROM_ARCHIVE", "0") in ("1","true","True","yes","YES")
+ARCHIVE = os.getenv("CLEAN_ARCHIVE", "1") in ("1","true","True","yes","YES")
+
+def read_chunks(path, chunk_rows=CHUNK_ROWS):
+    """DataFrames of at most chunk_rows raw rows (compression from the file name)."""
+    with pd.read_json(path, lines=True, chunksize=chunk_rows, dtype=False,
+                      convert_dates=False, compression="infer") as reader:
+        yield from reader
+
+def archive_chunks(platform, day, chunk_rows=CHUNK_ROWS):
+    """One raw archive partition as JSONL-like chunks (ISO timestamps, float counts)."""
+    from scripts.parquet_archive import load_archive
+    df = load_archive("raw", platforms=[platform], start=day, end=day)
+    for col in ("created_utc", "collected_utc"):
+        df[col] = df[col].map(lambda t: None if pd.isna(t) else t.isoformat().replace("+00:00", "Z"))
+    for at in range(0, len(df), chunk_rows):
+        yield df.iloc[at:at + chunk_rows]
+
+def archive_sources(platforms=LABELS):
+    """('archive', platform, day) jobs for every raw archive partition."""
+    from scripts.parquet_archive import list_partitions
+    return list(dict.fromkeys(("archive", plat, day) for plat, day, _ in list_partitions("raw", platforms)))
+
+def archive_clean(path, platform, chunk_rows=CHUNK_ROWS):
+    """Stream a clean CSV into the clean archive, replacing the days it covers."""
+    try:
+        from scripts.parquet_archive import DayPartitionWriter
+        w = DayPartitionWriter("clean", platform)
+        try:
+            for part in pd.read_csv(path, chunksize=chunk_rows, dtype=str, keep_default_na=False):
+                w.write(part.mask(part.eq("")))
+        except Exception:
+            w.abort()
+            raise
+        w.commit(replace=True)
+        print(f"[clean_stream] {platform}: archived {w.rows} clean rows in {len(w.writers)} day partition(s)")
+    except Exception as e:
+        print(f"[clean_stream] {platform}: clean archive not updated ({e})")
+
+class CleanWriter:
+    """Appends clean chunks to one CSV; the header (and column order) comes from the first chunk."""
+    def __init__(self, path):
+        self.path = path
+        self.tmp = path + ".part"
+        self.columns = None
+        self.rows = 0
+        self._fh = None
+
+    def write(self, df):
+        if df.empty:
+            return
+        if self._fh is None:
+            self.columns = list(df.columns)
+            self._fh = open(self.tmp, "w", encoding="utf-8", newline="")
+            df.to_csv(self._fh, index=False)
+        else:
+            df.reindex(columns=self.columns).to_csv(self._fh, index=False, header=False)
+        self.rows += len(df)
+
+    def commit(self):
+        if self._fh is None:
+            pd.DataFrame().to_csv(self.path, index=False)
+            return
+        self._fh.close()
+        os.replace(self.tmp, self.path)
+
+def clean_partition(path, platform, shard_path, chunk_rows, now):
+    """One raw snapshot (or archive partition) -> shard CSV. Returns (rows, dq_log, kpi partial); runs in a worker."""
+    w, dq_log, parts = CleanWriter(shard_path), [], []
+    chunks = archive_chunks(platform, path[2], chunk_rows) if isinstance(path, tuple) else read_chunks(path, chunk_rows)
+    for chunk in chunks:
+        clean = apply_filters(chunk, LABELS[platform], dq_log, now=now)
+        w.write(clean)
+        parts.append(kpi_partials(clean))
+    w.commit()
+    return w.rows, merge_dq_log(dq_log), merge_kpi_partials(parts)
+
+def merge_shards(out_path, shards):
+    """Concatenate shard CSVs in order; a shard whose header differs is re-aligned to the first one."""
+    tmp = out_path + ".part"
+    header = columns = None
+    with open(tmp, "w", encoding="utf-8", newline="") as out:
+        for shard in shards:
+            with open(shard, encoding="utf-8", newline="") as fh:
+                first = fh.readline()
+                if header is None:
+                    header, columns = first, list(pd.read_csv(shard, nrows=0).columns)
+                    out.write(first)
+                if first == header:
+                    shutil.copyfileobj(fh, out)
+                    continue
+            for part in pd.read_csv(shard, chunksize=CHUNK_ROWS, dtype=str, keep_default_na=False):
+                part.reindex(columns=columns).to_csv(out, index=False, header=False)
+    if header is None:  # nothing survived the filters
+        pd.DataFrame().to_csv(tmp, index=False)
+    os.replace(tmp, out_path)
+
+def collapse_csv(path, label, dq_log, chunk_rows=CHUNK_ROWS):
+    """Collapse near-duplicates in a clean CSV in place, chunk by chunk. Returns the rows kept."""
+    def chunks(**kw):
+        return pd.read_csv(path, chunksize=chunk_rows, dtype=str, keep_default_na=False, **kw)
+
+    def weights(part):
+        # an earlier collapse's dup_count is carried over
+        if "dup_count" not in part.columns:
+            return np.ones(len(part))
+        return pd.to_numeric(part["dup_count"], errors="coerce").fillna(1).to_numpy()
+
+    # pass 1: keep flag per row to a side file; folded rows' weight per group row
+    weighted = "dup_count" in pd.read_csv(path, nrows=0).columns
+    idx, folded, dropped = near_dupes.NearDupIndex(), {}, 0
+    flags = path + ".keep"
+    try:
+        with open(flags, "wb") as fh:
+            for part in chunks(usecols=["text", "dup_count"] if weighted else ["text"]):
+                rep = idx.add(part["text"].tolist())
+                keep = rep == idx.n - len(part) + np.arange(len(part))
+                keep.tofile(fh)
+                dropped += int((~keep).sum())
+                for g, wt in zip(rep[~keep].tolist(), weights(part)[~keep].tolist()):
+                    folded[g] = folded.get(g, 0) + wt
+        dq_log.append((label, "near_duplicate", dropped))
+
+        # pass 2: first row of each group, with the group size
+        w, at = CleanWriter(path), 0
+        with open(flags, "rb") as fh:
+            for part in chunks():
+                sel = np.fromfile(fh, dtype=bool, count=len(part))
+                rows = at + np.flatnonzero(sel)
+                out = part[sel].copy()
+                extra = np.fromiter((folded.get(g, 0) for g in rows.tolist()), dtype=float, count=len(rows))
+                out["dup_count"] = (weights(out) + extra).astype("int64")
+                w.write(out)
+                at += len(part)
+        w.commit()
+        return w.rows
+    finally:
+        if os.path.exists(flags):
+            os.remove(flags)
+
+def clean_files(paths, out_dir=DATA, chunk_rows=CHUNK_ROWS, now=None, workers=WORKERS, archive=ARCHIVE):
+    """
+    Clean every raw snapshot (partition) and merge in input order. Paths may
+    also be ('archive', platform, day) tuples from archive_sources().
+    Returns ({platform: (clean csv, rows)}, merged dq_log, {platform: kpis}).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    now = pd.Timestamp.now(tz="UTC") if now is None else pd.Timestamp(now)  # one clock for every partition
+    shard_dir = os.path.join(out_dir, ".shards")
+    os.makedirs(shard_dir, exist_ok=True)
+    jobs = []
+    for path in paths:
+        if isinstance(path, tuple):
+            jobs.append((path, path[1], os.path.join(shard_dir, f"{len(jobs):05d}_{path[1]}.csv"), chunk_rows, now))
+            continue
+        m = SNAPSHOT_RE.search(os.path.basename(path))
+        if not m:
+            print(f"[clean_stream] skipping {path}: name is not raw_<platform>_*.jsonl")
+            continue
+        jobs.append((path, m.group(1), os.path.join(shard_dir, f"{len(jobs):05d}_{m.group(1)}.csv"), chunk_rows, now))
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            results = list(pool.map(clean_partition, *zip(*jobs)))
+    else:
+        results = [clean_partition(*job) for job in jobs]
+
+    # deterministic merge: input order, whatever order the workers finished in
+    dq_log, shards, rows, parts = [], {}, {}, {}
+    for (_, platform, shard, _, _), (n, shard_dq, part) in zip(jobs, results):
+        dq_log = merge_dq_log(dq_log + shard_dq)
+        parts.setdefault(platform, []).append(part)
+        rows[platform] = rows.get(platform, 0) + n
+        shards.setdefault(platform, [])
+        if n:
+            shards[platform].append(shard)
+    outputs = {}
+    kpis = {p: finalize_kpis(merge_kpi_partials(ps)) for p, ps in parts.items()}
+    for platform, files in shards.items():
+        out_path = os.path.join(out_dir, f"clean_{platform}.csv")
+        merge_shards(out_path, files)
+        outputs[platform] = (out_path, rows[platform])
+        if near_dupes.THRESHOLD > 0 and rows[platform]:
+            collapsed = []
+            n = collapse_csv(out_path, LABELS[platform], collapsed, chunk_rows)
+            dq_log = merge_dq_log(dq_log + collapsed)
+            outputs[platform] = (out_path, n)
+        if archive and outputs[platform][1]:
+            archive_clean(out_path, platform, chunk_rows)
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    return outputs, dq_log, kpis
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean raw snapshot history chunk by chunk")
+    parser.add_argument("paths", nargs="*", default=["data/raw/raw_*.jsonl*"], help="raw JSONL snapshots (globs ok)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--out-dir", default=DATA)
+    parser.add_argument("--now", default=None, help="pin the engagement-density clock (ISO timestamp)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="partitions cleaned in parallel")
+    parser.add_argument("--from-archive", action="store_true", default=FROM_ARCHIVE,
+                        help="read raw rows from the Parquet archive instead of JSONL")
+    args = parser.parse_args()
+
+    if args.from_archive:
+        files = archive_sources()
+    else:
+        files = sorted({f for pat in args.paths for f in (glob.glob(pat) or [pat]) if not f.endswith(".part")})
+    t0 = time.perf_counter()
+    outputs, dq_log, kpis = clean_files(files, args.out_dir, args.chunk_rows, args.now, args.workers)
+    dq_path = os.path.join(args.out_dir, "data_quality_log.csv")
+    pd.DataFrame(dq_log, columns=["platform","reason","count"]).to_csv(dq_path, index=False)
+    today = dt.datetime.utcnow().date().isoformat()
+    kpi_path = os.path.join(args.out_dir, "kpi.csv")
+    pd.DataFrame([[today, LABELS[p], k["total"], k["pos"], k["top"], k["top_score"], k["avg_ed"], "backfill"]
+                  for p, k in kpis.items()],
+                 columns=["Date","Platform","TotalComments","PositivityRate","TopTrend","TopTrendScore","AvgEngagementDensity","Notes"]
+                 ).to_csv(kpi_path, index=False)
+
+    print("SUMMARY")
+    print(f" - Raw:   {len(files)} {'archive partition' if args.from_archive else 'snapshot file'}(s), chunks of {args.chunk_rows} rows, {args.workers} worker(s)")
+    for platform, (path, n) in outputs.items():
+        print(f" - Clean: {path} rows={n}")
+    print(f" - KPI:   {kpi_path} | rows={len(kpis)}")
+    print(f" - Logs:  {dq_path} | {time.perf_counter()-t0:.1f}s")
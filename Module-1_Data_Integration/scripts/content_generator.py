@@ -1,4 +1,5 @@
-from sheets_utils import get_all_rows, write_rows
+from sheets_utils import write_rows
+from sheet_frames import load_frame
 
 IN_SHEET = "ALL_COMMENTS"
 OUT_SHEET = "VARIANTS"
@@ -19,17 +20,19 @@ def snippet(text, limit=120):
     return (text[:limit].strip() + "...") if len(text) > limit else text
 
 def main():
-    rows = get_all_rows(IN_SHEET)
+    df = load_frame(IN_SHEET)
+    cols = {c: df[c].astype(object).where(df[c].notna(), "").tolist() if c in df.columns else [""] * len(df)
+            for c in ("comment", "text", "comment_id", "source")}
     out = []
-    for r in rows:
-        txt = r.get("comment") or r.get("text") or ""
+    for txt, alt, cid, src in zip(cols["comment"], cols["text"], cols["comment_id"], cols["source"]):
+        txt = txt or alt or ""
         sn = snippet(txt, limit=100)
         for i, t in enumerate(TEMPLATES):
             out.append({
-                "variant_id": f"{r.get('comment_id','')}_{i}",
+                "variant_id": f"{cid}_{i}",
                 "original_comment": txt,
                 "variant_text": t.format(snippet=sn),
-                "source": r.get("source","")
+                "source": str(src)
             })
     header = list(out[0].keys()) if out else ["variant_id","original_comment","variant_text","source"]
     rows_out = [[o[h] for h in header] for o in out]
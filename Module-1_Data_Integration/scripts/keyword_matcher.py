@@ -0,0 +1,203 @@
+# scripts/keyword_matcher.py
+"""
+One multi-pattern matcher for every keyword lexicon (marketing signals,
+toxicity, sentiment). All categories are found in a single pass over the
+text, so adding phrases does not add passes.
+
+    m = KeywordMatcher({"signal": [...], "toxic": [...]})
+    m.match("Link in bio for early access")     # {'signal': ['link in bio', 'early access'], 'toxic': []}
+    hits = m.match_many(texts)                   # batch: one scan over all texts
+    hits.any("toxic"), hits.lists("signal")
+
+Matching is substring-based on lowercased text, exactly like `phrase in text.lower()`.
+Phrases are reported in lexicon order. Backends:
+    ahocorasick  pyahocorasick's C automaton (used when installed)
+    automaton    the same Aho-Corasick automaton in pure Python
+    find         one str.find scan per phrase; faster than pure Python for small lexicons
+KEYWORD_BACKEND=auto picks ahocorasick, else find up to KEYWORD_FIND_MAX phrases, else automaton.
+"""
+import os
+import json
+import bisect
+from collections import deque
+
+import numpy as np
+
+try:
+    import ahocorasick  # pyahocorasick; optional C implementation
+except ImportError:
+    ahocorasick = None
+
+BACKEND  = os.getenv("KEYWORD_BACKEND", "auto").lower()
+FIND_MAX = int(os.getenv("KEYWORD_FIND_MAX", "256"))
+SEP = "\x00"  # joins a batch; never part of a phrase, so no match spans two texts
+
+class Matches:
+    """(row, phrase id) pairs for a batch, unique and sorted."""
+    def __init__(self, matcher, n, rows, ids):
+        self.matcher, self.n = matcher, n
+        pairs = np.unique(np.column_stack([rows, ids]), axis=0) if len(rows) else np.zeros((0, 2), int)
+        self.rows, self.ids = pairs[:, 0], pairs[:, 1]
+
+    def _of(self, category):
+        sel = self.matcher.category_of[self.ids] == self.matcher.categories.index(category) \
+            if category in self.matcher.categories else np.zeros(len(self.ids), bool)
+        return self.rows[sel], self.ids[sel]
+
+    def any(self, category):
+        mask = np.zeros(self.n, dtype=bool)
+        mask[self._of(category)[0]] = True
+        return mask
+
+    def lists(self, category):
+        """Per text, the category's phrases found, in lexicon order."""
+        out = [[] for _ in range(self.n)]
+        phrases = self.matcher.phrases
+        for r, i in zip(*self._of(category)):
+            out[r].append(phrases[i])
+        return out
+
+class KeywordMatcher:
+    def __init__(self, lexicons=None, backend=BACKEND):
+        self.backend = backend
+        self.categories, self.phrases, self._cats = [], [], []
+        self._seen = set()
+        self._built = None
+        for cat, phrases in (lexicons or {}).items():
+            self.add(cat, phrases)
+
+    def add(self, category, phrases):
+        """Extend a category; the automaton is rebuilt lazily on the next match."""
+        if category not in self.categories:
+            self.categories.append(category)
+        c = self.categories.index(category)
+        for p in phrases:
+            p = str(p).lower()
+            if p and (c, p) not in self._seen:
+                self._seen.add((c, p))
+                self.phrases.append(p)
+                self._cats.append(c)
+        self._built = None
+        return self
+
+    @property
+    def category_of(self):
+        return np.asarray(self._cats, dtype=int)
+
+    # ---- automaton
+    def _ids_by_phrase(self):
+        by = {}
+        for i, p in enumerate(self.phrases):
+            by.setdefault(p, []).append(i)
+        return by
+
+    def _build(self):
+        if self._built is not None:
+            return self._built
+        by = self._ids_by_phrase()
+        kind = self.backend
+        if kind == "auto":
+            kind = "ahocorasick" if ahocorasick is not None else ("find" if len(by) <= FIND_MAX else "automaton")
+        if kind == "ahocorasick":
+            if ahocorasick is None:
+                raise SystemExit("KEYWORD_BACKEND=ahocorasick needs the 'pyahocorasick' package")
+            auto = ahocorasick.Automaton()
+            for p, ids in by.items():
+                auto.add_word(p, ids)
+            if by:
+                auto.make_automaton()
+            self._built = (kind, auto)
+        elif kind == "automaton":
+            self._built = (kind, _PyAutomaton(by))
+        elif kind == "find":
+            self._built = (kind, list(by.items()))
+        else:
+            raise SystemExit(f"Unknown KEYWORD_BACKEND '{kind}' (use auto, ahocorasick, automaton or find)")
+        return self._built
+
+    # ---- matching
+    def match_many(self, texts, lower=True):
+        texts = ["" if t is None else str(t) for t in texts]
+        if lower:
+            texts = [t.lower() for t in texts]
+        joined = SEP.join(texts)
+        starts, pos = [], 0
+        for t in texts:
+            starts.append(pos)
+            pos += len(t) + 1
+        kind, auto = self._build()
+        rows, ids = [], []
+        if kind == "find":
+            n = len(texts)
+            for p, pids in auto:
+                i = joined.find(p)
+                while i != -1:
+                    r = bisect.bisect_right(starts, i) - 1
+                    rows.extend([r] * len(pids)); ids.extend(pids)
+                    if r + 1 == n:
+                        break
+                    i = joined.find(p, starts[r + 1])  # one hit per text is enough
+        elif self.phrases:
+            ends, found = [], []
+            for end, pids in auto.iter(joined):
+                ends.append(end)
+                found.append(pids)
+            if ends:
+                r_of = np.searchsorted(np.asarray(starts), np.asarray(ends), side="right") - 1
+                for r, pids in zip(r_of.tolist(), found):
+                    rows.extend([r] * len(pids)); ids.extend(pids)
+        return Matches(self, len(texts), np.asarray(rows, dtype=int), np.asarray(ids, dtype=int))
+
+    def match(self, text):
+        """{category: [phrases found, lexicon order]} for one text."""
+        t = ("" if text is None else str(text)).lower()
+        kind, auto = self._build()
+        if kind == "find":
+            found = {i for p, pids in auto if p in t for i in pids}
+        elif self.phrases:
+            found = {i for _, pids in auto.iter(t) for i in pids}
+        else:
+            found = set()
+        out = {c: [] for c in self.categories}
+        for i in sorted(found):
+            out[self.categories[self._cats[i]]].append(self.phrases[i])
+        return out
+
+class _PyAutomaton:
+    """Aho-Corasick: trie goto edges, failure links, merged outputs; iter() yields (end, ids)."""
+    def __init__(self, by_phrase):
+        self.goto, self.fail, self.out = [{}], [0], [[]]
+        for p, ids in by_phrase.items():
+            s = 0
+            for ch in p:
+                nxt = self.goto[s].get(ch)
+                if nxt is None:
+                    self.goto.append({}); self.fail.append(0); self.out.append([])
+                    nxt = self.goto[s][ch] = len(self.goto) - 1
+                s = nxt
+            self.out[s] = self.out[s] + list(ids)
+        queue = deque(self.goto[0].values())
+        while queue:
+            s = queue.popleft()
+            for ch, nxt in self.goto[s].items():
+                queue.append(nxt)
+                f = self.fail[s]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0) if s else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def iter(self, text):
+        goto, fail, out = self.goto, self.fail, self.out
+        s = 0
+        for end, ch in enumerate(text):
+            while s and ch not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(ch, 0)
+            if out[s]:
+                yield end, out[s]
+
+def load_lexicon(path):
+    """{category: [phrases]} from a JSON file, for KeywordMatcher.add()."""
+    with open(path, encoding="utf8") as fh:
+        return {c: list(p) for c, p in json.load(fh).items()}
@@ -3,20 +3,48 @@
 Safe merge RAW_YOUTUBE + RAW_REDDIT into ALL_COMMENTS.
 Handles differing columns, missing column names, dedupe, keeps rolling window,
 and falls back to a local CSV file if Sheets write fails.
+
+ALL_COMMENTS is kept as day partitions, oldest first. MERGE_PARTITION_DIR
+holds a manifest (header, rows per day) and, per day, the rows written and
+their dedupe keys (hash of source|comment_id, or of source|comment text when
+there is no id). A run drops the days that left the TIME_WINDOW_DAYS window
+(one row-range delete on Sheets) and adds only rows it has not seen, at the
+end of their day; history is never re-read or re-parsed. Input rows older
+than the window are dropped before they are hashed, and only the keys of the
+days the input touches are loaded. Cells are read as text (comment_id "1e5"
+stays "1e5"). The table is rebuilt
+from the inputs when there is no manifest, when the inputs bring columns
+ALL_COMMENTS does not have, or with MERGE_REBUILD=1.
 """
 import os
 import json
+import csv
+import hashlib
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
-from sheets_utils import get_all_rows, write_rows
+from sheets_utils import (
+    get_grid_since, write_rows, local_store, sheets_append_rows, sheets_insert_rows, sheets_delete_rows,
+    sheets_row_count,
+)
 from pprint import pprint
+from raw_sink import stable_path
+from sheet_frames import grid_frame
 
 RAW_SHEETS = [("RAW_YOUTUBE", "youtube"), ("RAW_REDDIT", "reddit")]
 OUT_SHEET = "ALL_COMMENTS"
 
+# read RAW_* from the Parquet archive (only the columns and days we keep)
+FROM_ARCHIVE = os.getenv("MERGE_FROM_ARCHIVE", "0") in ("1","true","True","yes","YES")
+ARCHIVE_COLUMNS = ["platform","video_id","post_id","post_title","source_url","comment_id",
+                   "author","text","likes_or_score","reply_count","created_utc"]
+
+PART_DIR  = Path(os.getenv("MERGE_PARTITION_DIR", "data/state/all_comments"))
+REBUILD   = os.getenv("MERGE_REBUILD", "0") in ("1","true","True","yes","YES")
+CSV_CHUNK_ROWS = int(os.getenv("MERGE_CSV_CHUNK_ROWS", "50000"))
+
 def normalize_df(rows, source_label):
-    if not rows:
+    if rows is None or len(rows) == 0:
         return pd.DataFrame()
     df = pd.DataFrame(rows)
     # normalize likely text column
@@ -30,34 +58,121 @@ def normalize_df(rows, source_label):
             df[c] = ""
     return df
 
+def cutoff_day(days: int = 60) -> str:
+    """First day (YYYY-MM-DD, UTC) inside the rolling window."""
+    return (pd.Timestamp.utcnow().tz_convert('UTC') - pd.Timedelta(days=int(days))).strftime("%Y-%m-%d")
+
 def keep_last_n_days(df: pd.DataFrame, days: int = 60) -> pd.DataFrame:
+    """Rows whose created_utc day is inside the window (whole days, like the partitions)."""
     if df is None or df.empty:
         return df
     if "created_utc" not in df.columns:
         return df
     df = df.copy()
     df['created_utc'] = pd.to_datetime(df['created_utc'], errors='coerce', utc=True)
-    cutoff = pd.Timestamp.utcnow().tz_convert('UTC') - pd.Timedelta(days=int(days))
-    return df[df['created_utc'] >= cutoff]
+    return df[row_days(df) >= cutoff_day(days)]
+
+def row_keys(df: pd.DataFrame) -> pd.Series:
+    """Stable per-row key: hash of source|comment_id, or of source|comment when the id is blank."""
+    source = df["source"].astype(str)
+    cid = df["comment_id"].astype(str).str.strip()
+    raw = ("id|" + source + "|" + cid).where(cid.ne("") & cid.ne("nan"), "text|" + source + "|" + df["comment"].astype(str))
+    return raw.map(lambda k: hashlib.blake2b(k.encode("utf8"), digest_size=12).hexdigest())
+
+def row_days(df: pd.DataFrame) -> pd.Series:
+    if "created_utc" not in df.columns:
+        return pd.Series("", index=df.index)
+    return pd.to_datetime(df["created_utc"], errors="coerce", utc=True).dt.strftime("%Y-%m-%d").fillna("")
+
+# ---- day partitions: ALL_COMMENTS is kept sorted by day; PART_DIR holds, per day,
+# the rows as written (<day>.csv) and their dedupe keys (<day>.keys), and a manifest
+# with the header and the row count of each day in table order
+def _part(day, ext):
+    return PART_DIR / f"{day}.{ext}"
+
+def load_manifest():
+    """{"header": [...], "days": [[day, rows], ...]} of the last merge, or None."""
+    try:
+        with open(PART_DIR / "manifest.json", encoding="utf8") as fh:
+            m = json.load(fh)
+        m["header"], m["days"]
+    except (OSError, ValueError, KeyError):
+        return None
+    if not all(_part(d, ext).exists() for d, _ in m["days"] for ext in ("csv", "keys")):
+        return None  # a partition went missing; rebuild
+    return m
+
+def save_manifest(header, days):
+    PART_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = PART_DIR / "manifest.json.part"
+    with open(tmp, "w", encoding="utf8") as fh:
+        json.dump({"header": list(header), "days": [[d, n] for d, n in days]}, fh)
+    os.replace(tmp, PART_DIR / "manifest.json")
+
+def drop_manifest():
+    """Forget the layout; the next merge rebuilds ALL_COMMENTS."""
+    (PART_DIR / "manifest.json").unlink(missing_ok=True)
+
+def load_keys(days):
+    keys = set()
+    for day in days:
+        with open(_part(day, "keys"), encoding="utf8") as fh:
+            keys.update(line.rstrip("\n") for line in fh)
+    return keys
+
+def add_to_partition(day, keys, rows):
+    PART_DIR.mkdir(parents=True, exist_ok=True)
+    with open(_part(day, "csv"), "a", encoding="utf8", newline="") as fh:
+        csv.writer(fh).writerows(rows)
+    with open(_part(day, "keys"), "a", encoding="utf8") as fh:
+        fh.writelines(k + "\n" for k in keys)
+
+def read_partition(day):
+    with open(_part(day, "csv"), encoding="utf8", newline="") as fh:
+        return list(csv.reader(fh))
+
+def drop_partition(day):
+    for ext in ("csv", "keys"):
+        _part(day, ext).unlink(missing_ok=True)
+
+def local_snapshot(label):
+    """data/raw_<label>.csv[.gz|.zst] written by the crawlers, or None."""
+    return stable_path(label)
+
+def in_window(df, cut):
+    """Rows whose created_utc day is >= cut (the day cutoff_day gives)."""
+    return df[row_days(df) >= cut] if not df.empty else df
+
+def load_from_archive(label, days):
+    from parquet_archive import load_archive
+    df = load_archive("raw", platforms=[label], start=cutoff_day(days), columns=ARCHIVE_COLUMNS)
+    return normalize_df(df, label)
+
+def load_from_csv(path, label, cut):
+    """A crawler snapshot, cells as written, window rows only (read in chunks)."""
+    with pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=CSV_CHUNK_ROWS) as reader:
+        parts = [in_window(normalize_df(chunk, label), cut) for chunk in reader]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
 
 def main():
     dfs = []
+    days = int(os.getenv("TIME_WINDOW_DAYS", "60"))
+    cut = cutoff_day(days)
     for sheet_name, label in RAW_SHEETS:
+        if FROM_ARCHIVE:
+            print(f"[MERGE] Using Parquet archive for {label}")
+            dfs.append(in_window(load_from_archive(label, days), cut))
+            continue
         # prefer local CSV snapshots if Google Sheets RAW_* not present
-        csv_path = Path(f"data/raw_{label}.csv")
-        if csv_path.exists():
+        csv_path = local_snapshot(label)
+        if csv_path is not None:
             print(f"[MERGE] Using local CSV {csv_path}")
-            df = pd.read_csv(csv_path)
+            dfs.append(load_from_csv(csv_path, label, cut))
         else:
             print(f"[MERGE] Using Google Sheet RAW_{label.upper()}")
-            rows = get_all_rows(sheet_name) or []
-            df = normalize_df(rows, label)
-        dfs.append(df)
-        continue
-
-        print(f"Reading {sheet_name}: rows={len(rows)}")
-        df = normalize_df(rows, label)
-        dfs.append(df)
+            # only the window (an index range scan on the SQLite store), cells as text
+            grid = get_grid_since(sheet_name, "created_utc", cut)
+            dfs.append(in_window(normalize_df(grid_frame(grid), label), cut))
 
     if not dfs:
         print("No input data found in RAW sheets.")
@@ -65,26 +180,114 @@ def main():
 
     combined = pd.concat(dfs, ignore_index=True, sort=False)
     before = len(combined)
+    manifest = load_manifest()
+    if combined.empty:
+        if manifest is None:
+            print("No input rows inside the window.")
+            return
+        # nothing new; the partitions that left the window still go
+        combined = pd.DataFrame(columns=["source", "comment_id", "comment", "created_utc"])
+    combined = combined.fillna("")
+    keys = row_keys(combined)
 
-    # dedupe by comment + source + comment_id if available
-    if set(("comment","source","comment_id")).issubset(combined.columns):
-        combined = combined.drop_duplicates(subset=["comment","source","comment_id"], keep="first")
-    else:
-        combined = combined.drop_duplicates(keep="first")
+    if REBUILD or manifest is None or not set(combined.columns) <= set(manifest["header"]):
+        rebuild(combined, keys, days, before)
+        return
+    advance(manifest, combined, keys, days, before)
 
-    combined = combined.fillna("")
+def groups_by_day(df, keys, header):
+    """[(day, keys, rows as text)] in day order, input order within a day."""
+    day = row_days(df)
+    out = []
+    for d in sorted(set(day)):
+        part = df[day == d]
+        out.append((d, keys[part.index].tolist(), part.reindex(columns=header, fill_value="").astype(str).values.tolist()))
+    return out
+
+def advance(manifest, combined, keys, days, before):
+    """
+    Incremental merge: drop the partitions that left the window, add the rows the
+    partition keys have not seen. Only the new rows' timestamps are parsed.
+    """
+    header, layout = manifest["header"], [(d, n) for d, n in manifest["days"]]
+    cut = cutoff_day(days)
+    expired = [(d, n) for d, n in layout if d < cut]
+    layout = [(d, n) for d, n in layout if d >= cut]
+    # a row's key can only be in the partition of its own day
+    touched = set(row_days(combined))
+    seen = load_keys(d for d, _ in layout if d in touched)
+
+    fresh = combined[~keys.isin(seen) & ~keys.duplicated()]
+    fresh = keep_last_n_days(fresh, days=days)
+    new = groups_by_day(fresh, keys, header)
+    print(f"Rows: input={before}, already_merged={int(keys.isin(seen).sum())}, new_in_window={len(fresh)}, "
+          f"expired_days={len(expired)} ({sum(n for _, n in expired)} rows)")
+    if not new and not expired:
+        print(f"Nothing new for '{OUT_SHEET}'.")
+        return
+    if local_store() is None:
+        # row offsets come from the manifest: if the sheet was edited by hand
+        # (rows added or removed), they point at the wrong rows
+        expect = 1 + sum(n for _, n in manifest["days"])
+        found = sheets_row_count(OUT_SHEET)
+        if found != expect:
+            print(f"[merge_to_all_comments] '{OUT_SHEET}' has {found} rows, the partitions {expect}; rebuilding")
+            rebuild(combined, keys, days, before)
+            return
+
+    try:
+        if local_store() is None:
+            if expired:  # oldest days are the first rows under the header
+                sheets_delete_rows(OUT_SHEET, 2, 1 + sum(n for _, n in expired))
+            # each day goes after the rows of its own and earlier days; insert from the
+            # bottom up so earlier offsets stay put, days past the end go in one append
+            last = layout[-1][0] if layout else ""
+            tail = [r for d, _, rows in new if d > last for r in rows]
+            sheets_append_rows(OUT_SHEET, tail, value_input_option="USER_ENTERED")
+            for d, _, rows in reversed([g for g in new if g[0] <= last]):
+                at = 2 + sum(n for ld, n in layout if ld <= d)
+                sheets_insert_rows(OUT_SHEET, rows, at, value_input_option="USER_ENTERED")
+        else:
+            # table_store backends have no row insert/delete; rewrite from the partitions
+            added = {d: rows for d, _, rows in new}
+            days_out = sorted({d for d, _ in layout} | set(added))
+            rows_out = [r for d in days_out for r in
+                        (read_partition(d) if d in dict(layout) else []) + added.get(d, [])]
+            write_rows(OUT_SHEET, header, rows_out)
+    except Exception as e:
+        drop_manifest()  # the table may be half-updated; rebuild next time
+        print(f"[merge_to_all_comments] partition update failed: {e}")
+        print("[merge_to_all_comments] ALL_COMMENTS will be rebuilt on the next run; wrote data/debug_all_comments.csv")
+        Path("data").mkdir(parents=True, exist_ok=True)
+        fresh.to_csv("data/debug_all_comments.csv", index=False)
+        return
+
+    for d, _ in expired:
+        drop_partition(d)
+    counts = dict(layout)
+    for d, ks, rows in new:
+        add_to_partition(d, ks, rows)
+        counts[d] = counts.get(d, 0) + len(rows)
+    save_manifest(header, sorted(counts.items()))
+    print(f"Added {len(fresh)} rows on {len(new)} day(s), dropped {len(expired)} expired day(s) in '{OUT_SHEET}'.")
+
+def rebuild(combined, keys, days, before):
+    """Full merge: dedupe every input row, apply the window, replace ALL_COMMENTS and its partitions."""
+    combined = combined[~keys.duplicated()]
 
     # rolling window
-    days = int(os.getenv("TIME_WINDOW_DAYS", "60"))
     combined = keep_last_n_days(combined, days=days)
 
     after = len(combined)
     print(f"Rows: before={before}, after_dedupe_and_window={after}")
 
+    # day order, so every day is one contiguous block of rows
+    combined = combined.iloc[row_days(combined).argsort(kind="stable")] if after else combined
     header = list(combined.columns)
     rows_out = combined[header].astype(str).values.tolist()
 
     # attempt write to Google Sheets; fallback to local CSV
+    drop_manifest()
     try:
         write_rows(OUT_SHEET, header, rows_out)
         print(f"Wrote {len(rows_out)} rows to sheet '{OUT_SHEET}'.")
@@ -94,6 +297,13 @@ def main():
         Path("data").mkdir(parents=True, exist_ok=True)
         combined.to_csv("data/debug_all_comments.csv", index=False)
         print("Wrote data/debug_all_comments.csv")
+        return
+    for old in PART_DIR.glob("*.csv"):
+        drop_partition(old.stem)
+    groups = groups_by_day(combined, keys, header)
+    for d, ks, rows in groups:
+        add_to_partition(d, ks, rows)
+    save_manifest(header, [(d, len(rows)) for d, _, rows in groups])
 
 if __name__ == "__main__":
     main()
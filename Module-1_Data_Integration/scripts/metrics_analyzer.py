@@ -6,7 +6,8 @@ and falls back to a safe no-op if none exist.
 """
 import pandas as pd
 from datetime import datetime
-from sheets_utils import append_row, get_all_rows
+from sheets_utils import append_row
+from sheet_frames import load_frame
 
 # Defensive import: accept multiple function names from slack_sender
 def _load_slack_send():
@@ -54,8 +55,9 @@ def _safe_send(msg):
 
 def compute_metrics():
     # read merged comments (ALL_COMMENTS) or fallback to a named sheet
-    rows = get_all_rows("ALL_COMMENTS") or get_all_rows("Sheet1") or []
-    df = pd.DataFrame(rows)
+    df = load_frame("ALL_COMMENTS")
+    if df.empty:
+        df = load_frame("Sheet1")
     total = len(df)
     if total == 0:
         print("No data")
@@ -0,0 +1,183 @@
+# scripts/near_dupes.py
+"""
+MinHash-LSH near-duplicate grouping for comment text.
+
+Copy-paste promo spam ("Download Coupert using this link ...") differs by a
+link, an emoji or a name, so exact drop_duplicates keeps every copy. Here each
+text is normalised (lowercase, URLs -> "url", punctuation dropped), cut into
+NEAR_DUP_SHINGLE-byte shingles and reduced to a NEAR_DUP_PERMS MinHash
+signature; signatures are bucketed band by band (NEAR_DUP_BANDS), and only
+rows sharing a bucket are compared. Pairs whose estimated Jaccard similarity
+is >= NEAR_DUP_THRESHOLD are joined into one group.
+
+    rep = near_duplicate_groups(texts)   # rep[i] = first row of i's group (rep[i] == i: keep)
+
+Shingling and hashing are vectorized over one byte buffer for the batch.
+NearDupIndex does the same for a stream of batches: it keeps only the band
+keys and signature of each group's first row, never the rows themselves, and
+only for the newest NEAR_DUP_MAX_GROUPS groups (a ring; 0 = unbounded), so its
+memory stays flat however long the stream. Rows arrive roughly in crawl order,
+so that is a sliding window: a copy of a comment that has fallen out of it
+starts a new group.
+"""
+import os
+import re
+
+import numpy as np
+
+THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))  # 0 turns collapsing off
+PERMS     = int(os.getenv("NEAR_DUP_PERMS", "64"))
+BANDS     = int(os.getenv("NEAR_DUP_BANDS", "16"))          # must divide PERMS
+SHINGLE   = int(os.getenv("NEAR_DUP_SHINGLE", "5"))         # bytes, at most 8
+MAX_GROUPS = int(os.getenv("NEAR_DUP_MAX_GROUPS", "500000"))  # NearDupIndex window, 0 = unbounded
+SEED      = 1
+
+URL_RE  = re.compile(r"https?://\S+|www\.\S+", re.I)
+JUNK_RE = re.compile(r"[\W_]+")
+
+def normalise(text):
+    t = URL_RE.sub(" url ", str(text or "").lower())
+    return JUNK_RE.sub(" ", t).strip()
+
+def _hash_params(perms):
+    rng = np.random.default_rng(SEED)
+    a = rng.integers(1, 2**63, size=perms, dtype=np.uint64) | np.uint64(1)  # odd multipliers
+    b = rng.integers(0, 2**63, size=perms, dtype=np.uint64)
+    return a, b
+
+def signatures(texts, perms=PERMS, k=SHINGLE):
+    """(n, perms) uint32 MinHash signatures over k-byte shingles of the normalised texts."""
+    n = len(texts)
+    if not n:
+        return np.zeros((0, perms), dtype=np.uint32)
+    raws = [normalise(t).encode("utf8").ljust(k) for t in texts]  # short texts: one padded shingle
+    buf = np.frombuffer(b"".join(raws), dtype=np.uint8)
+    lens = np.fromiter((len(r) for r in raws), dtype=np.int64, count=n)
+    starts = np.concatenate(([0], np.cumsum(lens)[:-1]))
+    wins = lens - k + 1  # shingles per text, >= 1
+
+    # shingle start offsets, text by text (no shingle crosses into the next text)
+    first = np.repeat(starts, wins)
+    pos = first + (np.arange(wins.sum()) - np.repeat(np.cumsum(wins) - wins, wins))
+    x = np.zeros(len(pos), dtype=np.uint64)
+    for j in range(k):
+        x = (x << np.uint64(8)) | buf[pos + j].astype(np.uint64)
+
+    # multiply-shift hashing, one permutation at a time to bound memory
+    a, b = _hash_params(perms)
+    seg = np.cumsum(wins) - wins
+    sig = np.empty((n, perms), dtype=np.uint32)
+    for p in range(perms):
+        h = ((x * a[p] + b[p]) >> np.uint64(32)).astype(np.uint32)
+        sig[:, p] = np.minimum.reduceat(h, seg)
+    return sig
+
+def _root(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def _check(perms, bands):
+    if perms % bands:
+        raise SystemExit(f"NEAR_DUP_PERMS ({perms}) must be a multiple of NEAR_DUP_BANDS ({bands})")
+
+def near_duplicate_groups(texts, threshold=THRESHOLD, perms=PERMS, bands=BANDS, sig=None):
+    """Per row, the index of its group's first row; groups are near-duplicates by MinHash-LSH."""
+    n = len(texts)
+    rep = np.arange(n)
+    if n < 2 or threshold <= 0:
+        return rep
+    _check(perms, bands)
+    sig = signatures(texts, perms) if sig is None else sig
+    r = perms // bands
+    parent = list(range(n))
+    for band in range(bands):
+        key = np.ascontiguousarray(sig[:, band * r:(band + 1) * r]).view(np.dtype((np.void, 4 * r))).ravel()
+        _, bucket = np.unique(key, return_inverse=True)
+        order = np.argsort(bucket, kind="stable")
+        b = bucket[order]
+        head = np.concatenate(([True], b[1:] != b[:-1]))
+        leader = np.empty(n, dtype=np.int64)
+        leader[order] = order[np.maximum.accumulate(np.where(head, np.arange(n), 0))]
+        cand = np.flatnonzero(leader != np.arange(n))
+        if not len(cand):
+            continue
+        # candidates only: verify against the bucket's first row
+        sim = (sig[cand] == sig[leader[cand]]).mean(axis=1)
+        for i, j in zip(cand[sim >= threshold].tolist(), leader[cand[sim >= threshold]].tolist()):
+            ri, rj = _root(parent, i), _root(parent, j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)  # the earliest row stays the representative
+    return np.asarray([_root(parent, i) for i in range(n)])
+
+class NearDupIndex:
+    """
+    near_duplicate_groups over batches that arrive one after another:
+
+        idx = NearDupIndex()
+        for chunk in chunks:
+            rep = idx.add(chunk_texts)   # global row numbers; rep[i] == idx.n - len(chunk) + i: keep
+
+    A row joins the earliest earlier group still in the window whose first row
+    shares a band bucket with it and is similar enough; groups are not merged
+    after the fact. Past max_groups groups the oldest one is forgotten for
+    each new one.
+    """
+    def __init__(self, threshold=THRESHOLD, perms=PERMS, bands=BANDS, max_groups=MAX_GROUPS):
+        _check(perms, bands)
+        self.threshold, self.perms, self.bands = threshold, perms, bands
+        self.max_groups = max(0, max_groups)
+        self.n = 0                                  # rows seen
+        self.groups = 0                             # groups started
+        self._buckets = [{} for _ in range(bands)]  # band key -> first group row in that bucket
+        self._sigs = np.zeros((0, perms), dtype=np.uint32)
+        self._rows = np.zeros(0, dtype=np.int64)    # slot -> group row
+        self._slot = {}                             # group row -> position in _sigs
+
+    def _keys(self, sig):
+        r = self.perms // self.bands
+        return [sig[b * r:(b + 1) * r].tobytes() for b in range(self.bands)]
+
+    def _store(self, g, sig, keys):
+        k = self.groups
+        if self.max_groups and k >= self.max_groups:
+            # ring full: the slot's old group leaves the window with its bucket entries
+            k %= self.max_groups
+            old = int(self._rows[k])
+            del self._slot[old]
+            for bk, key in zip(self._buckets, self._keys(self._sigs[k])):
+                if bk.get(key) == old:
+                    del bk[key]
+        elif k == len(self._sigs):
+            # doubling buffer (capped at the window): no full copy per batch
+            size = max(1024, 2 * k)
+            size = min(size, self.max_groups) if self.max_groups else size
+            sigs, rows = np.zeros((size, self.perms), dtype=np.uint32), np.zeros(size, dtype=np.int64)
+            sigs[:k], rows[:k] = self._sigs[:k], self._rows[:k]
+            self._sigs, self._rows = sigs, rows
+        self._sigs[k], self._rows[k] = sig, g
+        self._slot[g] = k
+        self.groups += 1
+        for bk, key in zip(self._buckets, keys):
+            bk.setdefault(key, g)
+
+    def add(self, texts):
+        base, m = self.n, len(texts)
+        self.n += m
+        if self.threshold <= 0 or not m:
+            return base + np.arange(m)
+        sig = signatures(texts, self.perms)
+        rep = near_duplicate_groups(texts, self.threshold, self.perms, self.bands, sig=sig)
+        target = base + np.arange(m)  # local group first row -> global group row
+        for i in np.flatnonzero(rep == np.arange(m)).tolist():
+            keys = self._keys(sig[i])
+            cand = sorted({bk[k] for bk, k in zip(self._buckets, keys) if k in bk})
+            if cand:
+                sim = (self._sigs[[self._slot[c] for c in cand]] == sig[i]).mean(axis=1)
+                hits = np.flatnonzero(sim >= self.threshold)
+                if len(hits):
+                    target[i] = cand[hits[0]]
+                    continue
+            self._store(base + i, sig[i], keys)
+        return target[rep]
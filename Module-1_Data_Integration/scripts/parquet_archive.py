@@ -0,0 +1,271 @@
+# scripts/parquet_archive.py
+"""
+Columnar archive of raw and clean comment data.
+
+Layout: data/archive/<kind>/platform=<youtube|reddit>/date=<YYYY-MM-DD>/part-*.parquet
+Raw partitions are keyed by crawl day; clean ones by the comment's own
+created_utc day, so a comment cleaned again lands in the same partition.
+Every partition is written with one fixed schema (typed UTC timestamps and
+integers), so readers can project columns and prune whole days without
+parsing anything they do not need. Adding rows to a day writes one more part
+file (never rewrites the day); readers keep the last copy of a comment_id
+within a day.
+
+raw_sink streams every committed crawl into a new part of its day, and
+clean_stream / run_once archive their clean rows; convert the JSONL history
+from before that once with:
+    python scripts/parquet_archive.py --convert data/raw/raw_*.jsonl
+"""
+import os
+import re
+import glob
+import time
+import argparse
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", "data/archive"))
+
+TS = pa.timestamp("us", tz="UTC")
+
+RAW_SCHEMA = pa.schema([
+    ("platform", pa.string()),
+    ("video_id", pa.string()),
+    ("post_id", pa.string()),
+    ("post_title", pa.string()),
+    ("source_url", pa.string()),
+    ("comment_id", pa.string()),
+    ("author", pa.string()),
+    ("text", pa.string()),
+    ("likes_or_score", pa.int64()),
+    ("reply_count", pa.int64()),
+    ("creator_heart_or_awards", pa.int64()),
+    ("author_cred_proxy", pa.int64()),
+    ("created_utc", TS),
+    ("collected_utc", TS),
+    ("category", pa.string()),
+    ("region", pa.string()),
+    ("view_count", pa.int64()),
+    ("like_count", pa.int64()),
+    ("channel_subscribers", pa.int64()),
+])
+
+CLEAN_SCHEMA = pa.schema(list(RAW_SCHEMA) + [
+    ("lang", pa.string()),
+    ("toxicity_score", pa.float64()),
+    ("sentiment_score", pa.float64()),
+    ("hashtags", pa.string()),           # JSON array, as in clean_*.csv
+    ("marketing_signals", pa.string()),  # JSON array
+    ("engagement_density", pa.float64()),
+    ("dup_count", pa.int64()),           # near-duplicate group size (null before collapsing)
+])
+
+SCHEMAS = {"raw": RAW_SCHEMA, "clean": CLEAN_SCHEMA}
+CONVERT_CHUNK_ROWS = int(os.getenv("ARCHIVE_CONVERT_CHUNK_ROWS", "50000"))
+
+SNAPSHOT_RE = re.compile(r"raw_(youtube|reddit)_(\d{4}-\d{2}-\d{2})")
+
+def platform_key(name):
+    return str(name).strip().lower()
+
+def to_table(df: pd.DataFrame, kind: str = "raw") -> pa.Table:
+    """Conform a DataFrame to the archive schema (missing columns -> null, extras dropped)."""
+    schema = SCHEMAS[kind]
+    out = {}
+    for field in schema:
+        col = df[field.name] if field.name in df.columns else pd.Series([None] * len(df), index=df.index)
+        if field.type == TS:
+            col = pd.to_datetime(col, errors="coerce", utc=True, format="ISO8601")
+        elif pa.types.is_integer(field.type):
+            col = pd.to_numeric(col, errors="coerce").round().astype("Int64")
+        elif pa.types.is_floating(field.type):
+            col = pd.to_numeric(col, errors="coerce").astype("float64")
+        else:
+            col = col.where(col.notna(), None).map(lambda v: v if v is None else str(v))
+        out[field.name] = pa.array(col, type=field.type, from_pandas=True)
+    return pa.Table.from_pydict(out, schema=schema)
+
+def partition_dir(kind, platform, date):
+    return ARCHIVE_DIR / kind / f"platform={platform_key(platform)}" / f"date={date}"
+
+def partition_path(kind, platform, date):
+    return partition_dir(kind, platform, date) / "part-0.parquet"
+
+class PartitionWriter:
+    """
+    Stream batches (DataFrames or lists of records) into a new part of one
+    platform/day partition; the part becomes visible on commit().
+    """
+    def __init__(self, kind, platform, date):
+        self.kind = kind
+        self.path = partition_dir(kind, platform, date) / f"part-{time.time_ns()}.parquet"
+        self.tmp = self.path.with_suffix(".tmp")
+        self.rows = 0
+        self._writer = None
+
+    def write(self, batch):
+        df = batch if isinstance(batch, pd.DataFrame) else pd.DataFrame(batch)
+        if df.empty:
+            return
+        if self._writer is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._writer = pq.ParquetWriter(self.tmp, SCHEMAS[self.kind], compression="zstd")
+        self._writer.write_table(to_table(df, self.kind))
+        self.rows += len(df)
+
+    def commit(self, replace=False):
+        """Close and publish the part (replace=True drops the day's other parts); None when nothing was written."""
+        if self._writer is None:
+            return None
+        self._writer.close()
+        os.replace(self.tmp, self.path)
+        if replace:
+            for old in self.path.parent.glob("part-*.parquet"):
+                if old != self.path:
+                    old.unlink(missing_ok=True)
+        return self.path
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+            self.tmp.unlink(missing_ok=True)
+
+class DayPartitionWriter:
+    """
+    Route batches into the partitions of their own day (the `column` date,
+    UTC; undated rows go to today's), one PartitionWriter per day.
+    """
+    def __init__(self, kind, platform, column="created_utc"):
+        self.kind, self.platform, self.column = kind, platform, column
+        self.writers = {}
+
+    def write(self, df):
+        if df.empty:
+            return
+        today = pd.Timestamp.now(tz="UTC").strftime("%Y-%m-%d")
+        days = (pd.to_datetime(df[self.column], errors="coerce", utc=True, format="ISO8601")
+                .dt.strftime("%Y-%m-%d").fillna(today))
+        for day, part in df.groupby(days.to_numpy(), sort=True):
+            if day not in self.writers:
+                self.writers[day] = PartitionWriter(self.kind, self.platform, day)
+            self.writers[day].write(part)
+
+    @property
+    def rows(self):
+        return sum(w.rows for w in self.writers.values())
+
+    def commit(self, replace=False):
+        """Publish every day's part; replace=True makes them the only part of their day."""
+        return [p for p in (w.commit(replace) for w in self.writers.values()) if p]
+
+    def abort(self):
+        for w in self.writers.values():
+            w.abort()
+
+def write_partition(df: pd.DataFrame, kind: str, platform: str, date: str) -> Path:
+    """Write (or replace) one platform/day partition atomically."""
+    path = partition_path(kind, platform, date)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    pq.write_table(to_table(df, kind), tmp, compression="zstd")
+    os.replace(tmp, path)
+    for old in path.parent.glob("part-*.parquet"):
+        if old != path:
+            old.unlink(missing_ok=True)
+    return path
+
+def add_to_partition(df: pd.DataFrame, kind: str, platform: str, date: str) -> Path:
+    """Add rows to one platform/day partition as a new part (a re-added comment_id wins on read)."""
+    w = PartitionWriter(kind, platform, date)
+    w.write(df)
+    return w.commit()
+
+def list_partitions(kind="raw", platforms=None, start=None, end=None):
+    """
+    Partition part files, oldest part first within a day, for the given platforms
+    and inclusive date range ('YYYY-MM-DD' strings or anything pd.Timestamp
+    accepts), pruned by path only.
+    """
+    start = pd.Timestamp(start).strftime("%Y-%m-%d") if start is not None else None
+    end = pd.Timestamp(end).strftime("%Y-%m-%d") if end is not None else None
+    wanted = {platform_key(p) for p in platforms} if platforms else None
+    found = []
+    for pdir in sorted((ARCHIVE_DIR / kind).glob("platform=*")):
+        plat = pdir.name.split("=", 1)[1]
+        if wanted is not None and plat not in wanted:
+            continue
+        for ddir in sorted(pdir.glob("date=*")):
+            day = ddir.name.split("=", 1)[1]
+            if (start and day < start) or (end and day > end):
+                continue
+            # part-0 (a full write) first, then added parts in write order
+            parts = sorted(ddir.glob("part-*.parquet"), key=lambda f: int(f.stem.split("-", 1)[1] or 0))
+            found.extend((plat, day, f) for f in parts)
+    return found
+
+def load_archive(kind="raw", platforms=None, start=None, end=None, columns=None) -> pd.DataFrame:
+    """Load only the requested columns from the partitions in range."""
+    schema = SCHEMAS[kind]
+    if columns is not None:
+        unknown = [c for c in columns if c not in schema.names]
+        if unknown:
+            raise ValueError(f"unknown archive columns: {unknown}")
+    parts = list_partitions(kind, platforms, start, end)
+    if not parts:
+        cols = columns or schema.names
+        return pa.Table.from_pylist([], schema=pa.schema([schema.field(c) for c in cols])).to_pandas()
+    read = None if columns is None else list(dict.fromkeys(list(columns) + ["comment_id"]))
+    by_day = {}
+    for plat, day, f in parts:
+        by_day.setdefault((plat, day), []).append(pq.read_table(f, columns=read))
+    tables = []
+    for day_parts in by_day.values():
+        table = pa.concat_tables(day_parts)
+        ids = table.column("comment_id").to_pandas()
+        keep = ~ids.duplicated(keep="last") | ids.isna()  # the latest copy of a re-added comment
+        tables.append(table.filter(pa.array(keep.to_numpy())))
+    table = pa.concat_tables(tables)
+    return (table if columns is None else table.select(list(columns))).to_pandas()
+
+def convert_jsonl(paths, kind="raw", chunk_rows=CONVERT_CHUNK_ROWS):
+    """
+    One-shot conversion of raw_<platform>_<date>.jsonl[.gz] snapshots into
+    partitions, streamed in chunks. Each file becomes a new part of its day,
+    so converting a day the sink already archived keeps both (deduped on read).
+    """
+    done = []
+    for path in paths:
+        m = SNAPSHOT_RE.search(os.path.basename(path))
+        if not m:
+            print(f"[archive] skipping {path}: name is not raw_<platform>_<YYYY-MM-DD>.jsonl")
+            continue
+        platform, date = m.group(1), m.group(2)
+        w = PartitionWriter(kind, platform, date)
+        try:
+            with pd.read_json(path, lines=True, chunksize=chunk_rows, dtype=False,
+                              convert_dates=False, compression="infer") as reader:
+                for chunk in reader:
+                    w.write(chunk)
+        except Exception:
+            w.abort()
+            raise
+        out = w.commit()
+        print(f"[archive] {path} -> {out} | rows={w.rows}")
+        if out:
+            done.append(out)
+    return done
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build / inspect the Parquet comment archive")
+    parser.add_argument("--convert", nargs="+", metavar="JSONL", help="raw JSONL snapshots (globs ok)")
+    parser.add_argument("--kind", default="raw", choices=sorted(SCHEMAS))
+    args = parser.parse_args()
+
+    if args.convert:
+        files = sorted({f for pat in args.convert for f in (glob.glob(pat) or [pat])})
+        convert_jsonl(files, kind=args.kind)
+    for plat, day, f in list_partitions(args.kind):
+        print(f"{args.kind} platform={plat} date={day} rows={pq.ParquetFile(f).metadata.num_rows}")
@@ -1,15 +1,26 @@
 # scripts/pull_reddit.py
 
 import os
+import sys
+import time
 import warnings
-import json
+import threading
 import datetime as dt
 import pandas as pd
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
 import praw
+from praw.models import MoreComments
 from prawcore.exceptions import Forbidden, NotFound, TooManyRequests, RequestException, ResponseException
 
+SCRIPT_DIR = Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+from ratelimit import TokenBucket
+from raw_sink import RawSnapshotSink
+
 # Quiet deprecation noise
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
@@ -26,22 +37,42 @@ TIME_WINDOW_DAYS      = int(os.getenv("TIME_WINDOW_DAYS", "60"))
 MAX_POSTS_PER_SOURCE  = int(os.getenv("MAX_POSTS_PER_SOURCE", "2"))
 MAX_COMMENTS_PER_POST = int(os.getenv("MAX_COMMENTS_PER_POST", "150"))
 
+# budget for expanding "load more comments" stubs, per post
+MORE_CALLS_BUDGET = int(os.getenv("REDDIT_MORE_CALLS", "8"))
+MORE_TIME_BUDGET  = float(os.getenv("REDDIT_MORE_SECONDS", "10"))
+
 # speed knobs (with safe defaults)
 TOP_LIMIT       = int(os.getenv("REDDIT_TOP_LIMIT", "40"))
 HOT_LIMIT       = int(os.getenv("REDDIT_HOT_LIMIT", "25"))
 SEARCH_KW_MAX   = int(os.getenv("REDDIT_SEARCH_KW_MAX", "6"))
 SEARCH_LIMIT    = int(os.getenv("REDDIT_SEARCH_LIMIT", "20"))
 
-if not (CLIENT_ID and SECRET):
-    raise SystemExit("Missing Reddit CLIENT_ID or SECRET in .env")
+# parallel scan knobs: workers share one bucket sized to the OAuth limit (100 QPM)
+SCAN_WORKERS    = max(1, int(os.getenv("REDDIT_SCAN_WORKERS", "1")))
+REQS_PER_MIN    = float(os.getenv("REDDIT_QPM", "100"))
+MAX_RETRIES     = int(os.getenv("REDDIT_MAX_RETRIES", "4"))
+
+LIMITER = TokenBucket(REQS_PER_MIN / 60.0, burst=int(os.getenv("REDDIT_BURST", "10")))
+_local = threading.local()
 
-# Read-only client (works with praw 7.8+ incl. 8.x)
-reddit = praw.Reddit(
-    client_id=CLIENT_ID,
-    client_secret=SECRET,
-    user_agent=USERAGENT
-)
-reddit.read_only = True
+def make_reddit():
+    """Read-only client (works with praw 7.8+ incl. 8.x)."""
+    if not (CLIENT_ID and SECRET):
+        raise SystemExit("Missing Reddit CLIENT_ID or SECRET in .env")
+    r = praw.Reddit(
+        client_id=CLIENT_ID,
+        client_secret=SECRET,
+        user_agent=USERAGENT
+    )
+    r.read_only = True
+    return r
+
+def client():
+    """One PRAW instance per thread (PRAW is not thread-safe)."""
+    r = getattr(_local, "reddit", None)
+    if r is None:
+        r = _local.reddit = make_reddit()
+    return r
 
 # Subreddits & keywords
 SUBS = [
@@ -63,53 +94,129 @@ def is_recent(utc_ts: float) -> bool:
     created = dt.datetime.fromtimestamp(utc_ts, tz=dt.timezone.utc)
     return (utc_now() - created).days <= TIME_WINDOW_DAYS
 
-def pick_posts():
+def _retry_after(exc):
+    """Seconds to wait after a 429, from Retry-After / x-ratelimit-reset headers."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    for h in ("retry-after", "x-ratelimit-reset"):
+        try:
+            return max(1.0, float(headers.get(h)))
+        except (TypeError, ValueError):
+            continue
+    return None
+
+def rate_limited(fn, cost=1):
     """
-    Gather candidates from top(month), hot, and search, filter by recency,
-    select best by adaptive score threshold, and cap per subreddit.
+    Run one API call under the shared token bucket. On 429 the whole bucket
+    pauses for the time the server asked for, then the call is retried.
     """
-    chosen = []
-    for s in SUBS:
-        print(f"[reddit] scanning r/{s} …")
+    for attempt in range(MAX_RETRIES + 1):
+        LIMITER.acquire(cost)
         try:
-            sub = reddit.subreddit(s)
-            cands = []
-
-            # Top-of-month & hot
-            cands.extend(list(sub.top(time_filter="month", limit=TOP_LIMIT)))
-            cands.extend(list(sub.hot(limit=HOT_LIMIT)))
-
-            # Keyword search
-            for q in KW[:SEARCH_KW_MAX]:
-                try:
-                    cands.extend(list(sub.search(q, sort="relevance", time_filter="month", limit=SEARCH_LIMIT)))
-                except Exception:
-                    pass
-
-            # window filter
-            cands = [p for p in cands if hasattr(p, "created_utc") and is_recent(p.created_utc)]
-            if not cands:
-                continue
+            return fn()
+        except TooManyRequests as e:
+            if attempt >= MAX_RETRIES:
+                raise
+            wait = _retry_after(e) or min(60.0, 2.0 ** (attempt + 1))
+            print(f"[reddit] rate limited; backing off {wait:.0f}s")
+            LIMITER.pause(wait)
 
-            # adaptive threshold on score; relax if needed
-            scores = sorted(int(getattr(p, "score", 0)) for p in cands)
-            def thr_at(pct):
-                if not scores: return 0
-                k = max(0, min(len(scores)-1, int(pct * len(scores)) - 1))
-                return scores[k]
-
-            kept_block = []
-            for pct in (0.75, 0.6, 0.5, 0.4, 0.3):
-                thr = thr_at(pct)
-                kept_block = [p for p in cands if int(getattr(p, "score", 0)) >= thr][:MAX_POSTS_PER_SOURCE]
-                if kept_block:
-                    break
-
-            chosen.extend(kept_block)
-        except Exception:
-            # subreddit unavailable or rate-limited; just continue
+def _pages(limit):
+    return max(1, -(-limit // 100))
+
+def scan_sub(s):
+    """
+    Gather candidates for one subreddit from top(month), hot, and search,
+    filter by recency and keep the best by adaptive score threshold.
+    Returns (post ids, error): Submission objects stay on the scanning thread's
+    PRAW instance, so only their ids are handed back.
+    """
+    print(f"[reddit] scanning r/{s} …")
+    try:
+        sub = client().subreddit(s)
+        cands = []
+
+        # Top-of-month & hot
+        cands.extend(rate_limited(lambda: list(sub.top(time_filter="month", limit=TOP_LIMIT)), _pages(TOP_LIMIT)))
+        cands.extend(rate_limited(lambda: list(sub.hot(limit=HOT_LIMIT)), _pages(HOT_LIMIT)))
+
+        # Keyword search
+        for q in KW[:SEARCH_KW_MAX]:
+            try:
+                cands.extend(rate_limited(
+                    lambda: list(sub.search(q, sort="relevance", time_filter="month", limit=SEARCH_LIMIT)),
+                    _pages(SEARCH_LIMIT)))
+            except Exception as e:
+                print(f"[reddit] r/{s}: search '{q}' failed ({type(e).__name__}: {e})")
+
+        # window filter
+        cands = [p for p in cands if hasattr(p, "created_utc") and is_recent(p.created_utc)]
+        if not cands:
+            return [], None
+
+        # adaptive threshold on score; relax if needed
+        scores = sorted(int(getattr(p, "score", 0)) for p in cands)
+        def thr_at(pct):
+            if not scores: return 0
+            k = max(0, min(len(scores)-1, int(pct * len(scores)) - 1))
+            return scores[k]
+
+        kept_block = []
+        for pct in (0.75, 0.6, 0.5, 0.4, 0.3):
+            thr = thr_at(pct)
+            kept_block = [p for p in cands if int(getattr(p, "score", 0)) >= thr][:MAX_POSTS_PER_SOURCE]
+            if kept_block:
+                break
+        return [p.id for p in kept_block], None
+    except Exception as e:
+        # subreddit unavailable or still rate-limited after retries: continue, but report it
+        print(f"[reddit] r/{s} skipped ({type(e).__name__}: {e})")
+        return [], f"{type(e).__name__}: {e}"
+
+def pick_posts():
+    """
+    Scan every subreddit and cap per subreddit. With REDDIT_SCAN_WORKERS > 1
+    subreddits are scanned in parallel behind the shared rate limiter;
+    results keep SUBS order either way.
+    Returns ([(subreddit, post id)], {subreddit: error} for the ones skipped).
+    """
+    if SCAN_WORKERS <= 1:
+        results = [scan_sub(s) for s in SUBS]
+    else:
+        with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as pool:
+            results = list(pool.map(scan_sub, SUBS))
+    chosen = [(s, pid) for s, (ids, _) in zip(SUBS, results) for pid in ids]
+    failed = {s: err for s, (_, err) in zip(SUBS, results) if err}
+    return chosen, failed
+
+def walk_comments(post, max_more_calls=MORE_CALLS_BUDGET, time_budget=MORE_TIME_BUDGET):
+    """
+    Yield a post's comments breadth-first without materializing the tree.
+    Already-loaded comments come first; MoreComments stubs are only expanded
+    (one API call each) once those run out, while the call and time budgets
+    last. Stop iterating to stop fetching.
+    """
+    deadline = time.monotonic() + time_budget
+    calls = 0
+    queue, more = deque(rate_limited(lambda: list(post.comments))), deque()
+    while queue or more:
+        if not queue:
+            if calls >= max_more_calls or time.monotonic() >= deadline:
+                return
+            calls += 1
+            stub = more.popleft()
+            try:
+                queue.extend(rate_limited(stub.comments))
+            except Exception:
+                pass
             continue
-    return chosen
+        item = queue.popleft()
+        if isinstance(item, MoreComments):
+            more.append(item)
+            continue
+        yield item
+        replies = getattr(item, "replies", None)
+        if replies:
+            queue.extend(replies)
 
 def fetch_comments(post):
     """
@@ -117,17 +224,21 @@ def fetch_comments(post):
     Robust to deleted/suspended users and transient API errors.
     """
     out = []
-    try:
-        post.comments.replace_more(limit=0)
-    except Exception:
-        return out
-
-    kept = 0
-    for c in post.comments.list():
+    # one cutoff per post; same rule as (now - created).days <= TIME_WINDOW_DAYS
+    cutoff = (utc_now() - dt.timedelta(days=TIME_WINDOW_DAYS + 1)).timestamp()
+    comments = walk_comments(post)
+    while len(out) < MAX_COMMENTS_PER_POST:
         try:
-            created = dt.datetime.fromtimestamp(c.created_utc, tz=dt.timezone.utc)
-            if (utc_now() - created).days > TIME_WINDOW_DAYS:
+            c = next(comments)
+        except StopIteration:
+            break
+        except Exception:
+            # submission fetch failed
+            break
+        try:
+            if c.created_utc <= cutoff:
                 continue
+            created = dt.datetime.fromtimestamp(c.created_utc, tz=dt.timezone.utc)
 
             # avoid author karma lookups; many authors are deleted/suspended
             author_name = None
@@ -137,6 +248,7 @@ def fetch_comments(post):
             except Exception:
                 author_name = None
 
+            replies = getattr(c, "replies", None) or []
             out.append({
                 "platform": "reddit",
                 "post_id": post.id,
@@ -144,15 +256,12 @@ def fetch_comments(post):
                 "created_utc": created.isoformat().replace("+00:00", "Z"),
                 "text": c.body or "",
                 "likes_or_score": int(getattr(c, "score", 0) or 0),
-                "reply_count": len(getattr(c, "replies", [])) if getattr(c, "replies", None) else 0,
+                "reply_count": sum(1 for r in replies if not isinstance(r, MoreComments)),
                 "creator_heart_or_awards": len(getattr(c, "all_awardings", [])) if getattr(c, "all_awardings", None) else 0,
                 "author_cred_proxy": 0,   # kept constant to avoid costly author API calls
                 "author": author_name,
                 "source_url": f"https://reddit.com{getattr(post, 'permalink', '')}",
             })
-            kept += 1
-            if kept >= MAX_COMMENTS_PER_POST:
-                break
 
         except (Forbidden, NotFound):
             continue
@@ -160,33 +269,32 @@ def fetch_comments(post):
             continue
         except Exception:
             continue
+    comments.close()
     return out
 
-def collect_reddit_raw() -> pd.DataFrame:
-    rows = []
-    per_sub = {}
-    posts = pick_posts()
-    for p in posts:
-        subname = getattr(getattr(p, "subreddit", None), "display_name", "unknown")
+def iter_reddit_rows():
+    """Yield comment rows post by post as they are fetched."""
+    per_sub, rows = {}, 0
+    posts, failed = pick_posts()
+    for subname, pid in posts:
         per_sub[subname] = per_sub.get(subname, 0) + 1
         if per_sub[subname] > MAX_POSTS_PER_SOURCE:
             continue
-        rows += fetch_comments(p)
-    return pd.DataFrame(rows)
+        # rehydrate on this thread's client (lazy: the comments fetch loads it)
+        for row in fetch_comments(client().submission(id=pid)):
+            rows += 1
+            yield row
+    print(f"[reddit] summary — {len(SUBS) - len(failed)}/{len(SUBS)} subreddits scanned, "
+          f"{sum(per_sub.values())} posts, {rows} comments")
+    for subname, err in failed.items():
+        print(f"[reddit]   r/{subname} skipped: {err}")
 
-if __name__ == "__main__":
-    if __name__ == "__main__":
-        os.makedirs("data/raw", exist_ok=True)
-    df = collect_reddit_raw()
-    # save CSV and jsonl daily snapshot
-    out_csv = f"data/raw/raw_reddit_{dt.datetime.utcnow().strftime('%Y-%m-%dT%H%MZ')}.csv"
-    out_jsonl = f"data/raw/raw_reddit_{dt.datetime.utcnow().strftime('%Y-%m-%d')}.jsonl"
-    df.to_csv(out_csv, index=False)
-    # jsonl
-    with open(out_jsonl, "w", encoding="utf8") as fh:
-        for rec in df.to_dict(orient="records"):
-            fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
-    # also write a stable file used by pipeline
-    df.to_csv("data/raw_reddit.csv", index=False)
-    print(f"Wrote {out_csv} | rows = {len(df)}")
+def collect_reddit_raw() -> pd.DataFrame:
+    return pd.DataFrame(list(iter_reddit_rows()))
 
+if __name__ == "__main__":
+    # rows stream straight to disk; RAW_COMPRESSION=none|gzip|zstd
+    with RawSnapshotSink("reddit") as sink:
+        for rec in iter_reddit_rows():
+            sink.write(rec)
+    print(f"Wrote {sink.paths['csv']} | rows = {sink.rows}")
@@ -1,7 +1,20 @@
 # scripts/pull_youtube.py
-import os, requests, datetime as dt, pandas as pd, json
+import os, sys, requests, datetime as dt, pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+from ratelimit import TokenBucket
+from yt_cache import ResponseCache
+from yt_checkpoints import CheckpointStore
+import yt_planner
+import text_quality
+from raw_sink import RawSnapshotSink
+from yt_planner import QuotaMeter, popular_key, search_key
 
 REPO_ENV = Path(__file__).resolve().parents[1] / ".env"
 load_dotenv(dotenv_path=REPO_ENV)
@@ -19,6 +32,17 @@ SEARCH_KWS          = [k.strip() for k in os.getenv("YT_SEARCH_KEYWORDS", "").sp
 SEARCH_MAX_VIDS_KW  = int(os.getenv("YT_SEARCH_MAX_VIDEOS_PER_KW", "20"))
 COMMENTS_PER_SEARCH = int(os.getenv("YT_COMMENTS_PER_SEARCH_VIDEO", "50"))
 
+# Comment fetch concurrency (1 = serial) and a global request cap across workers
+CONCURRENCY         = max(1, int(os.getenv("YT_CONCURRENCY", "1")))
+MAX_RPS             = float(os.getenv("YT_MAX_RPS", "10"))
+MAX_RETRIES         = int(os.getenv("YT_MAX_RETRIES", "4"))  # retries after a 429
+
+# Incremental mode: only fetch comments newer than each video's last crawl
+INCREMENTAL         = os.getenv("YT_INCREMENTAL", "0") in ("1","true","True","yes","YES")
+
+# Quota planner: spend YT_DAILY_QUOTA on the combinations that paid off before
+PLANNER             = os.getenv("YT_PLANNER", "0") in ("1","true","True","yes","YES")
+
 BASE = "https://www.googleapis.com/youtube/v3"
 
 # Stable categories for mostPopular (avoid the ones that often 404)
@@ -32,20 +56,49 @@ YTCATS = {
     
 }
 
+# One keep-alive session for every call; the pool is sized for the workers
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=max(10, CONCURRENCY)))
+LIMITER = TokenBucket(MAX_RPS)
+CACHE   = ResponseCache()  # TTLs / bypass via YT_CACHE_* env
+QUOTA   = QuotaMeter()
+
 # ---------------- helpers ----------------
 def is_english_ascii(text: str, thresh: float = 0.95) -> bool:
-    if not text:
-        return False
-    ascii_ratio = sum(1 for ch in text if ord(ch) < 128) / max(1, len(text))
-    return ascii_ratio > thresh
+    return text_quality.is_english(text, thresh)
+
+def _retry_after(r):
+    """Seconds to wait after a 429, from the Retry-After header."""
+    try:
+        return max(1.0, float(r.headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return None
 
 def yt_get(path, params):
+    """
+    One API call through the cache and the shared rate limiter. On 429 every
+    worker pauses for the time the server asked for (or an exponential
+    backoff), then the call is retried up to YT_MAX_RETRIES times.
+    """
+    cached = CACHE.get(path, params)
+    if cached is not None:
+        return cached
     if not API_KEY:
         raise SystemExit("Missing YOUTUBE_API_KEY in .env")
     try:
-        r = requests.get(f"{BASE}/{path}", params={**params, "key": API_KEY}, timeout=30)
+        for attempt in range(MAX_RETRIES + 1):
+            LIMITER.acquire()
+            r = SESSION.get(f"{BASE}/{path}", params={**params, "key": API_KEY}, timeout=30)
+            if r.status_code != 429 or attempt >= MAX_RETRIES:
+                break
+            wait = _retry_after(r) or min(60.0, 2.0 ** (attempt + 1))
+            print(f"[YT] rate limited on {path}; backing off {wait:.0f}s")
+            LIMITER.pause(wait)
+        QUOTA.charge(path)
         r.raise_for_status()
-        return r.json()
+        data = r.json()
+        CACHE.put(path, params, data)
+        return data
     except requests.HTTPError:
         try:
             detail = r.json()
@@ -53,16 +106,35 @@ def yt_get(path, params):
             detail = r.text
         raise SystemExit(f"YT API error {r.status_code} on {path}: {detail}")
 
+# units actually spent per discovery combination this run (cache hits are free)
+DISCOVERY_UNITS = {}
+
+def discovery_get(combo, path, params):
+    """yt_get for the discovery streams, charging the units it spends to `combo`."""
+    before = QUOTA.units()
+    try:
+        return yt_get(path, params)
+    finally:
+        DISCOVERY_UNITS[combo] = DISCOVERY_UNITS.get(combo, 0) + QUOTA.units() - before
+
 # --------------- Stream A: Popular ---------------
-def popular_candidates():
+def popular_candidates(plan_items=None):
     """
     Use low-quota videos.list?chart=mostPopular with part=snippet,statistics.
     Store title/channel/engagement now; never call videos?id=... later.
+    plan_items: planner output; only planned (region, category) pairs are
+    fetched, each capped at its planned page count.
     """
+    planned = None
+    if plan_items is not None:
+        planned = {(c["region"], c["category"]): c["pages"] for c in plan_items if c["stream"] == "popular"}
     seen = {}
     for region in REGIONS:
         for cat_name, cat_id in YTCATS.items():
-            token, fetched = None, 0
+            if planned is not None and (region, cat_name) not in planned:
+                continue
+            max_pages = planned[(region, cat_name)] if planned is not None else None
+            token, fetched, pages = None, 0, 0
             while True:
                 params = {
                     "part": "snippet,statistics",
@@ -74,9 +146,10 @@ def popular_candidates():
                 if token:
                     params["pageToken"] = token
                 try:
-                    data = yt_get("videos", params)
+                    data = discovery_get(popular_key(region, cat_id), "videos", params)
                 except SystemExit:
                     break  # quietly skip rare gaps
+                pages += 1
                 for it in data.get("items", []):
                     vid = it.get("id")
                     if not vid or vid in seen:
@@ -92,6 +165,7 @@ def popular_candidates():
                         "comment_count": int(st.get("commentCount", 0) or 0),
                         "view_count":    int(st.get("viewCount", 0) or 0),
                         "like_count":    int(st.get("likeCount", 0) or 0),
+                        "combo": popular_key(region, cat_id),
                     }
                     fetched += 1
                     if fetched >= POPULAR_MAX_PER_CAT:
@@ -99,29 +173,37 @@ def popular_candidates():
                 if fetched >= POPULAR_MAX_PER_CAT:
                     break
                 token = data.get("nextPageToken")
-                if not token:
+                if not token or (max_pages and pages >= max_pages):
                     break
     return seen  # dict[video_id] -> meta
 
 # --------------- Stream B: Marketing Search ---------------
-def search_marketing_videos():
+def search_marketing_videos(plan_items=None):
     """
     Use search.list to find brand/product/ads videos.
     We only take snippet and mark as 'marketing' stream.
+    plan_items: planner output; only planned keywords are searched.
     """
     if not SEARCH_KWS:
         return {}
+    planned = None
+    if plan_items is not None:
+        planned = {c["q"]: c["pages"] for c in plan_items if c["stream"] == "marketing"}
     seen = {}
     for kw in SEARCH_KWS:
-        token, fetched = None, 0
+        if planned is not None and kw not in planned:
+            continue
+        max_pages = planned[kw] if planned is not None else None
+        token, fetched, pages = None, 0, 0
         while True:
             params = {"part": "snippet", "q": kw, "type": "video", "maxResults": 50}
             if token:
                 params["pageToken"] = token
             try:
-                data = yt_get("search", params)
+                data = discovery_get(search_key(kw), "search", params)
             except SystemExit:
                 break
+            pages += 1
             for it in data.get("items", []):
                 vid = (it.get("id") or {}).get("videoId")
                 if not vid or vid in seen:
@@ -137,6 +219,7 @@ def search_marketing_videos():
                     "comment_count": 100,
                     "view_count": 0,
                     "like_count": 0,
+                    "combo": search_key(kw),
                 }
                 fetched += 1
                 if fetched >= SEARCH_MAX_VIDS_KW:
@@ -144,7 +227,7 @@ def search_marketing_videos():
             if fetched >= SEARCH_MAX_VIDS_KW:
                 break
             token = data.get("nextPageToken")
-            if not token:
+            if not token or (max_pages and pages >= max_pages):
                 break
     return seen
 
@@ -171,27 +254,48 @@ def select_videos(candidates):
     return picked
 
 # ---------------- comments ----------------
-def fetch_comments(video_id, keep_english=True, max_keep=20):
+def fetch_comments(video_id, keep_english=True, max_keep=20, since=None):
+    """
+    since: checkpoint entry for the video ({'last_published', 'known_ids'}).
+    When given, threads are paged newest-first, comments already kept (known_ids)
+    are skipped, and paging stops past the publishedAt watermark (comments at the
+    watermark itself are walked; known_ids drops the ones already kept).
+    Returns (rows, complete): complete only when the walk reached the watermark
+    or ran out of pages without an API error; after a max_keep cut or an error
+    there may be unseen comments between the watermark and the rows.
+    """
     rows, token, kept = [], None, 0
+    known = set(since["known_ids"]) if since else set()
+    watermark = since.get("last_published", "") if since else ""
+    reached_known = exhausted = False
     while True:
         params = {
             "part": "snippet",
             "videoId": video_id,
             "maxResults": 50,
             "textFormat": "plainText",
-            "order": "relevance",
+            "order": "time" if since else "relevance",
         }
         if token:
             params["pageToken"] = token
         try:
             data = yt_get("commentThreads", params)
-        except SystemExit:
+        except SystemExit as e:
+            print(f"[YT] comments for {video_id} stopped early: {e}")
             break
-        for it in data.get("items", []):
-            s  = (it.get("snippet", {}).get("topLevelComment", {}).get("snippet", {}) or {})
+        items = data.get("items", [])
+        snippets = [(it.get("snippet", {}).get("topLevelComment", {}).get("snippet", {}) or {}) for it in items]
+        # whole page scored in one batch
+        english = text_quality.english_mask([s.get("textDisplay", "") for s in snippets]) if keep_english else None
+        for i, (it, s) in enumerate(zip(items, snippets)):
             th = (it.get("snippet") or {})
             txt = s.get("textDisplay", "")
-            if keep_english and not is_english_ascii(txt):
+            if since and watermark and s.get("publishedAt", "") < watermark:
+                reached_known = True
+                break
+            if it.get("id", "") in known:
+                continue  # kept by an earlier, capped run
+            if keep_english and not english[i]:
                 continue
             rows.append({
                 "platform": "YouTube",
@@ -210,30 +314,71 @@ def fetch_comments(video_id, keep_english=True, max_keep=20):
             kept += 1
             if kept >= max_keep:
                 break
-        if kept >= max_keep:
+        if kept >= max_keep or reached_known:
             break
         token = data.get("nextPageToken")
         if not token:
+            exhausted = True
             break
-    return rows
+    return rows, reached_known or exhausted
+
+def map_videos(fn, video_ids):
+    """
+    Run fn over video_ids, serially or on a bounded thread pool (YT_CONCURRENCY).
+    Results come back in input order either way, so output files match the serial path.
+    """
+    if CONCURRENCY <= 1 or len(video_ids) <= 1:
+        for vid in video_ids:
+            yield fn(vid)
+        return
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        yield from pool.map(fn, video_ids)
 
 # ---------------- orchestrator ----------------
-def collect_youtube_raw():
+def plan_discovery():
+    """Quota plan for this run: discovery pages within budget, comment pages held back."""
+    popular_pages = -(-POPULAR_MAX_PER_CAT // 50)
+    search_pages  = -(-SEARCH_MAX_VIDS_KW // 50)
+    reserve = TARGET_VIDEOS * -(-max(COMMENTS_PER_VIDEO, COMMENTS_PER_SEARCH) // 50) * yt_planner.UNIT_COST["commentThreads"]
+    plan = yt_planner.build_plan(REGIONS, YTCATS, SEARCH_KWS, popular_pages, search_pages, reserve=reserve)
+    print(f"[YT] plan — {len(plan['items'])} combos, {plan['planned_units']} discovery units "
+          f"+ {reserve} reserved for comments | skipped {len(plan['skipped'])}")
+    return plan
+
+def iter_youtube_rows():
+    """Yield comment rows as they are fetched (selection order is preserved)."""
+    QUOTA.reset()
+    DISCOVERY_UNITS.clear()
     # Build both streams
-    pop = popular_candidates()
-    mkt = search_marketing_videos()
+    plan = plan_discovery() if PLANNER else None
+    plan_items = plan["items"] if plan else None
+    pop = popular_candidates(plan_items)
+    mkt = search_marketing_videos(plan_items)
     cands = {}
     cands.update(pop)
-    cands.update(mkt)
+    for vid, meta in mkt.items():
+        # marketing metadata drives selection as before, but the planner credits
+        # the combination that found the video first (popular runs first)
+        cands[vid] = {**meta, "combo": pop[vid]["combo"]} if vid in pop else meta
     print(f"[YT] candidates — popular: {len(pop)} | marketing: {len(mkt)} | combined: {len(cands)}")
 
     selected = select_videos(cands)
 
-    rows = []
-    for vid in selected:
+    checkpoints = CheckpointStore() if INCREMENTAL else None
+
+    def fetch_one(vid):
         meta = cands.get(vid, {})
         max_keep = COMMENTS_PER_SEARCH if meta.get("stream") == "marketing" else COMMENTS_PER_VIDEO
-        coms = fetch_comments(vid, keep_english=ONLY_ENGLISH, max_keep=max_keep)
+        since = checkpoints.get(vid) if checkpoints else None
+        return fetch_comments(vid, keep_english=ONLY_ENGLISH, max_keep=max_keep, since=since)
+
+    rows, warm, fetched_counts = 0, 0, {}
+    for vid, (coms, complete) in zip(selected, map_videos(fetch_one, selected)):
+        meta = cands.get(vid, {})
+        fetched_counts[vid] = len(coms)
+        if checkpoints:
+            warm += checkpoints.get(vid) is not None
+            checkpoints.update(vid, coms, complete=complete)
         for r in coms:
             r["category"] = meta.get("category", "")
             r["region"]   = meta.get("region", "")
@@ -241,19 +386,24 @@ def collect_youtube_raw():
             r["view_count"] = meta.get("view_count", 0)
             r["like_count"] = meta.get("like_count", 0)
             r["channel_subscribers"] = 0  # optional backfill later
-            rows.append(r)
+            rows += 1
+            yield r
+
+    if checkpoints:
+        checkpoints.save()
+        print(f"[YT] incremental — {warm}/{len(selected)} videos resumed from checkpoints | new comments: {rows}")
+    print(f"[YT] cache — {CACHE.report()}")
+    if plan:
+        yt_planner.record_run(plan, cands, selected, fetched_counts, units=DISCOVERY_UNITS)
+    print(f"[YT] quota — {yt_planner.quota_report(plan, QUOTA, cands, selected, cache_hits=CACHE.hits)}")
 
-    return pd.DataFrame(rows)
+def collect_youtube_raw():
+    return pd.DataFrame(list(iter_youtube_rows()))
 
 # ---------------- CLI ----------------
 if __name__ == "__main__":
-    os.makedirs("data/raw", exist_ok=True)
-    df = collect_youtube_raw()
-    out_csv = f"data/raw/raw_youtube_{dt.datetime.utcnow().strftime('%Y-%m-%dT%H%MZ')}.csv"
-    out_jsonl = f"data/raw/raw_youtube_{dt.datetime.utcnow().strftime('%Y-%m-%d')}.jsonl"
-    df.to_csv(out_csv, index=False)
-    with open(out_jsonl, "w", encoding="utf8") as fh:
-        for rec in df.to_dict(orient="records"):
-            fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
-    df.to_csv("data/raw_youtube.csv", index=False)
-    print("Wrote", out_csv, "| rows=", len(df))
+    # rows stream straight to disk; RAW_COMPRESSION=none|gzip|zstd
+    with RawSnapshotSink("youtube") as sink:
+        for rec in iter_youtube_rows():
+            sink.write(rec)
+    print("Wrote", sink.paths["csv"], "| rows=", sink.rows)
@@ -0,0 +1,53 @@
+# scripts/ratelimit.py
+"""
+Small thread-safe token bucket shared by the crawlers.
+One bucket is created per API and handed to every worker thread, so the
+request rate stays under the cap no matter how many workers are running.
+"""
+import time
+import threading
+
+
+class TokenBucket:
+    """
+    rate:  tokens added per second (<= 0 disables limiting)
+    burst: bucket size; defaults to one second worth of tokens
+    """
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = float(rate or 0)
+        self.burst = float(burst if burst is not None else max(1.0, self.rate))
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        # _stamp is in the future while paused: nothing accrues until the pause ends
+        if now > self._stamp:
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+
+    def acquire(self, tokens: float = 1.0):
+        """Block until `tokens` are available, then take them."""
+        if self.rate > 0 and tokens > self.burst:
+            raise ValueError(f"cannot acquire {tokens} tokens from a bucket of {self.burst}")
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self.rate <= 0:
+                        return
+                    if self._tokens >= tokens:
+                        self._tokens -= tokens
+                        return
+                    wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for `seconds` (e.g. after a 429); refilling restarts from empty after it."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + max(0.0, seconds))
+            self._tokens = 0.0
+            self._stamp = max(self._stamp, self._blocked_until)
@@ -0,0 +1,182 @@
+# scripts/raw_sink.py
+"""
+Streaming raw snapshot writer shared by pull_youtube and pull_reddit.
+
+Rows are appended to JSONL + CSV (optionally compressed) as they arrive (no
+DataFrame), flushed every few hundred rows, and renamed into place on commit.
+Each run gets its own timestamped files, so a rerun never truncates what an
+earlier (or crashed) run left. If the crawl dies, the *.part files on disk
+still hold everything flushed so far.
+
+The stable data/raw_<platform>.csv is a hard link to the run's snapshot (a
+copy only where links are not supported): replace it, never rewrite it in place.
+With RAW_ARCHIVE=1 the same rows are streamed, in RAW_ARCHIVE_BATCH batches,
+into a new part of the day's Parquet archive partition.
+"""
+import os
+import io
+import csv
+import json
+import gzip
+import shutil
+import datetime as dt
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # optional; only needed for RAW_COMPRESSION=zstd
+    zstandard = None
+
+RAW_DIR     = Path(os.getenv("RAW_DIR", "data/raw"))
+STABLE_DIR  = Path(os.getenv("RAW_STABLE_DIR", "data"))
+COMPRESSION = os.getenv("RAW_COMPRESSION", "none").lower()
+FLUSH_EVERY = int(os.getenv("RAW_FLUSH_EVERY", "200"))
+ARCHIVE     = os.getenv("RAW_ARCHIVE", "1") == "1"   # add each committed crawl to the Parquet archive
+ARCHIVE_BATCH = int(os.getenv("RAW_ARCHIVE_BATCH", "5000"))
+
+SUFFIX = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+def open_text(path, compression, mode="wt"):
+    """Open a text stream for writing/reading with the given compression."""
+    if compression == "gzip":
+        return gzip.open(path, mode, encoding="utf8", newline="")
+    if compression == "zstd":
+        if zstandard is None:
+            raise SystemExit("RAW_COMPRESSION=zstd needs the 'zstandard' package")
+        if "r" in mode:
+            raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        else:
+            raw = zstandard.ZstdCompressor(level=3).stream_writer(open(path, "wb"), closefd=True)
+        return io.TextIOWrapper(raw, encoding="utf8", newline="")
+    return open(path, mode.replace("t", ""), encoding="utf8", newline="")
+
+def stable_path(platform, stable_dir=STABLE_DIR):
+    """
+    The pipeline's stable raw_<platform>.csv[.gz|.zst]: the newest variant on
+    disk, or None. Every reader of the stable file resolves it through here.
+    """
+    found = [p for p in (Path(stable_dir) / f"raw_{platform}.csv{ext}" for ext in SUFFIX.values()) if p.exists()]
+    return max(found, key=lambda p: p.stat().st_mtime) if found else None
+
+def compression_of(path):
+    name = str(path)
+    if name.endswith(".gz"):
+        return "gzip"
+    if name.endswith(".zst"):
+        return "zstd"
+    return "none"
+
+class RawSnapshotSink:
+    """
+    with RawSnapshotSink("youtube") as sink:
+        for rec in iter_youtube_rows():
+            sink.write(rec)
+    sink.paths -> {'csv': ..., 'jsonl': ..., 'stable': ...}
+    """
+    def __init__(self, platform, out_dir=RAW_DIR, stable_dir=STABLE_DIR,
+                 compression=COMPRESSION, flush_every=FLUSH_EVERY):
+        if compression not in SUFFIX:
+            raise SystemExit(f"Unknown RAW_COMPRESSION '{compression}' (use none, gzip or zstd)")
+        now = dt.datetime.utcnow()
+        ext = SUFFIX[compression]
+        self.platform = platform
+        self.day = now.strftime('%Y-%m-%d')
+        self.compression = compression
+        self.flush_every = max(1, flush_every)
+        self.out_dir, self.stable_dir = Path(out_dir), Path(stable_dir)
+        stamp = now.strftime('%Y-%m-%dT%H%M%SZ')
+        self.paths = {
+            "csv":    self.out_dir / f"raw_{platform}_{stamp}.csv{ext}",
+            "jsonl":  self.out_dir / f"raw_{platform}_{stamp}.jsonl{ext}",
+            "stable": self.stable_dir / f"raw_{platform}.csv{ext}",
+        }
+        self.rows = 0
+        self._csv_fh = self._jsonl_fh = self._writer = None
+        self._archive, self._batch = None, []
+
+    def _part(self, key):
+        return self.paths[key].with_name(self.paths[key].name + ".part")
+
+    def __enter__(self):
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.stable_dir.mkdir(parents=True, exist_ok=True)
+        self._csv_fh = open_text(self._part("csv"), self.compression)
+        self._jsonl_fh = open_text(self._part("jsonl"), self.compression)
+        if ARCHIVE:
+            try:
+                from parquet_archive import PartitionWriter
+                self._archive = PartitionWriter("raw", self.platform, self.day)
+            except ImportError as e:
+                print(f"[raw_sink] {self.platform}: Parquet archive off ({e})")
+        return self
+
+    def write(self, rec):
+        if self._writer is None:
+            self._writer = csv.DictWriter(self._csv_fh, fieldnames=list(rec.keys()), extrasaction="ignore")
+            self._writer.writeheader()
+        self._writer.writerow(rec)
+        self._jsonl_fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self.rows += 1
+        if self._archive is not None:
+            self._batch.append(rec)
+            if len(self._batch) >= ARCHIVE_BATCH:
+                self._archive_batch()
+        if self.rows % self.flush_every == 0:
+            self.flush()
+
+    def _archive_batch(self):
+        # the archive is a by-product: a failure turns it off, it never fails the crawl
+        batch, self._batch = self._batch, []
+        try:
+            self._archive.write(batch)
+        except Exception as e:
+            print(f"[raw_sink] {self.platform}: Parquet archive not updated ({e})")
+            self._archive.abort()
+            self._archive = None
+
+    def flush(self):
+        for fh in (self._csv_fh, self._jsonl_fh):
+            fh.flush()
+
+    def _close(self):
+        for fh in (self._csv_fh, self._jsonl_fh):
+            if fh is not None and not fh.closed:
+                fh.close()
+
+    def commit(self):
+        """Close the streams and atomically move both files (and the stable CSV) into place."""
+        self._close()
+        os.replace(self._part("csv"), self.paths["csv"])
+        os.replace(self._part("jsonl"), self.paths["jsonl"])
+        # stable name for the pipeline: a link to the snapshot, no second write
+        tmp = self._part("stable")
+        tmp.unlink(missing_ok=True)
+        try:
+            os.link(self.paths["csv"], tmp)
+        except OSError:
+            shutil.copyfile(self.paths["csv"], tmp)
+        os.replace(tmp, self.paths["stable"])
+        for ext in SUFFIX.values():  # one stable variant: drop the other compressions
+            other = self.stable_dir / f"raw_{self.platform}.csv{ext}"
+            if other != self.paths["stable"]:
+                other.unlink(missing_ok=True)
+        if self._archive is not None:
+            if self._batch:
+                self._archive_batch()
+            if self._archive is not None:
+                out = self._archive.commit()
+                if out:
+                    print(f"[raw_sink] {self.platform}: archived {self._archive.rows} rows -> {out}")
+        return self.paths
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            # keep the flushed .part files so a crashed crawl is not lost
+            self._close()
+            if self._archive is not None:
+                self._archive.abort()
+            print(f"[raw_sink] {self.platform}: crawl failed after {self.rows} rows; "
+                  f"partial files left at {self._part('jsonl')} and {self._part('csv')}")
+        return False
@@ -0,0 +1,318 @@
+# scripts/replay.py
+"""
+Offline replay of recorded crawls through the live crawler code paths.
+
+ReplaySession serves data/raw/raw_youtube_*.jsonl as the YouTube Data API
+(videos?chart=mostPopular, search, commentThreads) behind pull_youtube.yt_get;
+ReplayReddit serves raw_reddit_*.jsonl through a PRAW-like subreddit /
+submission / comment interface for pull_reddit. Both can add per-call latency
+and inject 429s, so crawler throughput and concurrency settings can be
+measured without network or quota:
+
+    python scripts/replay.py youtube --latency-ms 80 --concurrency 8
+    python scripts/replay.py reddit --latency-ms 120 --workers 4 --qpm 600 --error-rate 0.02
+"""
+import os
+import re
+import sys
+import glob
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import datetime as dt
+from pathlib import Path
+
+import requests
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+from raw_sink import open_text, compression_of
+
+REPLAY_DIR = Path(os.getenv("REPLAY_DIR", str(SCRIPT_DIR / "data" / "raw")))
+SUB_RE = re.compile(r"/r/([^/]+)/")
+
+def load_snapshots(platform, pattern=None):
+    """All recorded rows for a platform, de-duplicated by comment_id (latest snapshot wins)."""
+    pattern = pattern or str(REPLAY_DIR / f"raw_{platform}_*.jsonl*")
+    rows = {}
+    for path in sorted(glob.glob(pattern)):
+        if path.endswith(".part"):
+            continue
+        with open_text(path, compression_of(path), mode="rt") as fh:
+            for line in fh:
+                if line.strip():
+                    rec = json.loads(line)
+                    rows[(rec.get("post_id") or rec.get("video_id"), rec.get("comment_id"))] = rec
+    return list(rows.values())
+
+def _parse_ts(s):
+    return dt.datetime.fromisoformat(str(s).replace("Z", "+00:00")).timestamp()
+
+def _iso(ts):
+    return dt.datetime.fromtimestamp(ts, tz=dt.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+class Faults:
+    """Latency + 429 injection shared by both adapters."""
+    def __init__(self, latency_ms=0.0, error_rate=0.0, retry_after=1, seed=0):
+        self.latency = max(0.0, latency_ms) / 1000.0
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.calls = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def hit(self):
+        """Sleep for the simulated round trip; return True if this call should 429."""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            fail = self.error_rate > 0 and self._rng.random() < self.error_rate
+            self.errors += fail
+        return fail
+
+# ---------------- YouTube ----------------
+class ReplayResponse:
+    def __init__(self, status_code, payload, headers=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.headers = headers or {}
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} replay error", response=self)
+
+class ReplaySession:
+    """Stands in for pull_youtube.SESSION (a requests.Session)."""
+    def __init__(self, categories, rows=None, faults=None, shift_to_now=True):
+        self.faults = faults or Faults()
+        rows = load_snapshots("youtube") if rows is None else rows
+        shift = 0.0
+        if shift_to_now and rows:
+            shift = time.time() - max(_parse_ts(r["created_utc"]) for r in rows if r.get("created_utc"))
+        self.videos, self.comments = {}, {}
+        for r in rows:
+            vid = r.get("video_id")
+            if not vid:
+                continue
+            v = self.videos.setdefault(vid, {
+                "id": vid, "title": r.get("post_title", ""), "region": r.get("region", ""),
+                "cat_id": categories.get(r.get("category", "")), "views": int(r.get("view_count") or 0),
+                "likes": int(r.get("like_count") or 0), "comments": 0,
+            })
+            v["comments"] += 1 + int(r.get("reply_count") or 0)
+            published = _iso(_parse_ts(r["created_utc"]) + shift) if r.get("created_utc") else ""
+            self.comments.setdefault(vid, []).append({
+                "id": r.get("comment_id", ""),
+                "snippet": {
+                    "totalReplyCount": int(r.get("reply_count") or 0),
+                    "topLevelComment": {"snippet": {
+                        "textDisplay": r.get("text", ""),
+                        "authorDisplayName": r.get("author", ""),
+                        "likeCount": int(r.get("likes_or_score") or 0),
+                        "publishedAt": published,
+                    }},
+                },
+            })
+
+    @staticmethod
+    def _page(items, params):
+        size = int(params.get("maxResults", 50))
+        start = int(params.get("pageToken") or 0)
+        out = {"items": items[start:start + size]}
+        if start + size < len(items):
+            out["nextPageToken"] = str(start + size)
+        return out
+
+    def _video_item(self, v):
+        return {"id": v["id"], "snippet": {"title": v["title"], "channelId": ""},
+                "statistics": {"commentCount": v["comments"], "viewCount": v["views"], "likeCount": v["likes"]}}
+
+    def get(self, url, params=None, timeout=None):
+        params = params or {}
+        if self.faults.hit():
+            return ReplayResponse(429, {"error": {"code": 429, "message": "replay: rate limited"}},
+                                  headers={"retry-after": str(self.faults.retry_after)})
+        path = url.rsplit("/", 1)[-1]
+        if path == "videos":
+            region, cat = params.get("regionCode"), params.get("videoCategoryId")
+            items = [self._video_item(v) for v in self.videos.values()
+                     if v["region"] == region and str(v["cat_id"]) == str(cat)]
+            return ReplayResponse(200, self._page(items, params))
+        if path == "search":
+            words = [w for w in str(params.get("q", "")).lower().split() if w]
+            mkt = [v for v in self.videos.values() if v["region"] == "marketing"]
+            hits = [v for v in mkt if any(w in v["title"].lower() for w in words)] or mkt
+            items = [{"id": {"videoId": v["id"]}, "snippet": {"title": v["title"], "channelId": ""}} for v in hits]
+            return ReplayResponse(200, self._page(items, params))
+        if path == "commentThreads":
+            items = list(self.comments.get(params.get("videoId"), []))
+            snip = lambda it: it["snippet"]["topLevelComment"]["snippet"]
+            if params.get("order") == "time":
+                items.sort(key=lambda it: snip(it)["publishedAt"], reverse=True)
+            else:
+                items.sort(key=lambda it: snip(it)["likeCount"], reverse=True)
+            return ReplayResponse(200, self._page(items, params))
+        return ReplayResponse(404, {"error": {"code": 404, "message": f"replay: no endpoint {path}"}})
+
+def install_youtube(session, state_dir=None):
+    """
+    Point pull_youtube at a ReplaySession (no API key). Cache, quota reports,
+    planner stats and incremental checkpoints all go to state_dir, so a replay
+    never touches the real files under data/state.
+    """
+    import pull_youtube, yt_planner, yt_checkpoints
+    from yt_cache import ResponseCache
+    state_dir = Path(state_dir or tempfile.mkdtemp(prefix="yt_replay_"))
+    pull_youtube.SESSION = session
+    pull_youtube.API_KEY = pull_youtube.API_KEY or "replay"
+    pull_youtube.CACHE = ResponseCache(root=state_dir / "cache", ttl_hours={})
+    yt_planner.REPORT_DIR = state_dir
+    yt_planner.STATS_PATH = state_dir / "yt_discovery_stats.json"
+    yt_checkpoints.CHECKPOINT_PATH = state_dir / "yt_checkpoints.json"
+    return pull_youtube
+
+# ---------------- Reddit ----------------
+class _FakeHTTP:
+    """Just enough of requests.Response for prawcore's TooManyRequests."""
+    def __init__(self, retry_after):
+        self.status_code = 429
+        self.headers = {"retry-after": str(retry_after), "x-ratelimit-reset": str(retry_after)}
+        self.text = "replay: rate limited"
+
+class _Named:
+    def __init__(self, name):
+        self.name = name
+        self.display_name = name
+
+class ReplayComment:
+    def __init__(self, r, shift):
+        self.id = r.get("comment_id", "")
+        self.body = r.get("text", "")
+        self.score = int(r.get("likes_or_score") or 0)
+        self.created_utc = _parse_ts(r["created_utc"]) + shift
+        self.author = _Named(r["author"]) if r.get("author") else None
+        self.replies = []
+        self.all_awardings = [None] * int(r.get("creator_heart_or_awards") or 0)
+
+class ReplaySubmission:
+    def __init__(self, post_id, sub, permalink, comments, faults):
+        self.id = post_id
+        self.subreddit = _Named(sub)
+        self.permalink = permalink
+        self.title = ""
+        self._comments = comments
+        self._faults = faults
+        self.score = sum(c.score for c in comments)
+        self.created_utc = min(c.created_utc for c in comments)
+
+    @property
+    def comments(self):
+        # like PRAW: the first access loads the submission's comment tree
+        _maybe_429(self._faults)
+        return self._comments
+
+def _maybe_429(faults):
+    if faults.hit():
+        from prawcore.exceptions import TooManyRequests
+        raise TooManyRequests(_FakeHTTP(faults.retry_after))
+
+class ReplaySubreddit:
+    def __init__(self, name, posts, faults):
+        self.display_name = name
+        self._posts = posts
+        self._faults = faults
+
+    def _listing(self, posts, limit):
+        _maybe_429(self._faults)
+        return iter(posts[:limit or len(posts)])
+
+    def top(self, time_filter="all", limit=100):
+        return self._listing(sorted(self._posts, key=lambda p: p.score, reverse=True), limit)
+
+    def hot(self, limit=100):
+        return self._listing(sorted(self._posts, key=lambda p: p.created_utc, reverse=True), limit)
+
+    def search(self, query, sort="relevance", time_filter="all", limit=100):
+        q = str(query).lower()
+        hits = [p for p in self._posts if any(q in c.body.lower() for c in p._comments)]
+        return self._listing(hits, limit)
+
+class ReplayReddit:
+    """Stands in for a read-only praw.Reddit instance."""
+    def __init__(self, rows=None, faults=None, shift_to_now=True):
+        self.faults = faults or Faults()
+        self.read_only = True
+        rows = load_snapshots("reddit") if rows is None else rows
+        shift = 0.0
+        if shift_to_now and rows:
+            shift = time.time() - max(_parse_ts(r["created_utc"]) for r in rows if r.get("created_utc"))
+        by_post = {}
+        for r in rows:
+            if r.get("post_id") and r.get("created_utc"):
+                by_post.setdefault(r["post_id"], []).append(r)
+        self._subs = {}
+        for post_id, rs in by_post.items():
+            url = rs[0].get("source_url", "")
+            m = SUB_RE.search(url)
+            sub = m.group(1) if m else "unknown"
+            permalink = url.split("reddit.com", 1)[-1]
+            post = ReplaySubmission(post_id, sub, permalink, [ReplayComment(r, shift) for r in rs], self.faults)
+            self._subs.setdefault(sub.lower(), []).append(post)
+
+    def subreddit(self, name):
+        return ReplaySubreddit(name, self._subs.get(name.lower(), []), self.faults)
+
+def install_reddit(reddit):
+    """Point pull_reddit at a ReplayReddit (shared by all worker threads)."""
+    import pull_reddit
+    pull_reddit.make_reddit = lambda: reddit
+    pull_reddit._local = threading.local()
+    return pull_reddit
+
+# ---------------- CLI ----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded crawls and measure crawler throughput")
+    parser.add_argument("platform", choices=["youtube", "reddit"])
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=None, help="YouTube: YT_CONCURRENCY")
+    parser.add_argument("--rps", type=float, default=None, help="YouTube: YT_MAX_RPS")
+    parser.add_argument("--workers", type=int, default=None, help="Reddit: REDDIT_SCAN_WORKERS")
+    parser.add_argument("--qpm", type=float, default=None, help="Reddit: REDDIT_QPM")
+    args = parser.parse_args()
+
+    faults = Faults(args.latency_ms, args.error_rate, args.retry_after)
+    t0 = time.perf_counter()
+    if args.platform == "youtube":
+        import pull_youtube
+        mod = install_youtube(ReplaySession(pull_youtube.YTCATS, faults=faults))
+        if args.concurrency:
+            mod.CONCURRENCY = args.concurrency
+        if args.rps is not None:
+            mod.LIMITER.rate = args.rps
+        load_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        n = sum(1 for _ in mod.iter_youtube_rows())
+    else:
+        mod = install_reddit(ReplayReddit(faults=faults))
+        if args.workers:
+            mod.SCAN_WORKERS = args.workers
+        if args.qpm:
+            mod.LIMITER.rate = args.qpm / 60.0
+        load_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        n = sum(1 for _ in mod.iter_reddit_rows())
+    secs = time.perf_counter() - t0
+    print(f"[replay] {args.platform}: rows={n} calls={faults.calls} injected_429={faults.errors} "
+          f"load={load_s:.2f}s crawl={secs:.2f}s rows/s={n / secs if secs else 0:.0f}")
@@ -1,26 +1,52 @@
 import os, json, datetime as dt, pandas as pd
 from scripts.pull_youtube import collect_youtube_raw
 from scripts.pull_reddit import collect_reddit_raw
-from scripts.clean_and_signals import apply_filters, compute_kpis
+from scripts.clean_and_signals import apply_filters, collapse_near_duplicates, compute_kpis
+from scripts.near_dupes import THRESHOLD as NEAR_DUP_THRESHOLD
+from scripts.signal_matrix import signal_rollup
 from scripts.sheets_append import append_rows
 
 
 DATA = "data"
 os.makedirs(DATA, exist_ok=True)
 
+def replace_csv(df, path):
+    # data/raw_<platform>.csv may be a hard link to a crawl snapshot: swap it, never write through it
+    tmp = path + ".tmp"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+def archive_frames(kind, frames, by_day):
+    """Add DataFrames to the Parquet archive; a failure is logged, never fatal."""
+    try:
+        from scripts.parquet_archive import DayPartitionWriter, add_to_partition
+        today = dt.datetime.utcnow().date().isoformat()
+        for platform, df in frames.items():
+            if df.empty:
+                continue
+            if by_day:  # clean rows: partition by their own created_utc day
+                w = DayPartitionWriter(kind, platform)
+                w.write(df)
+                w.commit()
+            else:       # raw rows: partition by crawl day, like raw_sink
+                add_to_partition(df, kind, platform, today)
+        return f"archived {kind}"
+    except Exception as e:
+        return f"{kind} archive not updated ({e})"
+
 def main():
     # 1) Pull raw
     yt = collect_youtube_raw()
     rd = collect_reddit_raw()
     yt_path = os.path.join(DATA, "raw_youtube.csv")
     rd_path = os.path.join(DATA, "raw_reddit.csv")
-    (yt if not yt.empty else yt.head(0)).to_csv(yt_path, index=False)
-    (rd if not rd.empty else rd.head(0)).to_csv(rd_path, index=False)
+    replace_csv(yt if not yt.empty else yt.head(0), yt_path)
+    replace_csv(rd if not rd.empty else rd.head(0), rd_path)
 
     # 2) Clean + signals + DQ log
     dq_log=[]
-    yt_clean = apply_filters(yt, "YouTube", dq_log)
-    rd_clean = apply_filters(rd, "Reddit", dq_log)
+    yt_clean = collapse_near_duplicates(apply_filters(yt, "YouTube", dq_log), "YouTube", dq_log)
+    rd_clean = collapse_near_duplicates(apply_filters(rd, "Reddit", dq_log), "Reddit", dq_log)
 
     cy_path = os.path.join(DATA, "clean_youtube.csv")
     cr_path = os.path.join(DATA, "clean_reddit.csv")
@@ -29,6 +55,8 @@ def main():
     (rd_clean if not rd_clean.empty else rd_clean.head(0)).to_csv(cr_path, index=False)
     all_clean = pd.concat([yt_clean, rd_clean], ignore_index=True) if not yt_clean.empty or not rd_clean.empty else pd.DataFrame()
     (all_clean if not all_clean.empty else pd.DataFrame().head(0)).to_csv(ca_path, index=False)
+    archive_msg = " | ".join([archive_frames("raw", {"youtube": yt, "reddit": rd}, by_day=False),
+                              archive_frames("clean", {"youtube": yt_clean, "reddit": rd_clean}, by_day=True)])
 
     # 3) KPIs
     today = dt.datetime.utcnow().date().isoformat()
@@ -39,6 +67,10 @@ def main():
     ]
     kpi_path = os.path.join(DATA, "kpi.csv")
     pd.DataFrame(kpi_rows, columns=["Date","Platform","TotalComments","PositivityRate","TopTrend","TopTrendScore","AvgEngagementDensity","Notes"]).to_csv(kpi_path, index=False)
+    # per-signal engagement / positivity, straight off the signal matrix
+    trend_path = os.path.join(DATA, "signal_trends.csv")
+    pd.concat([signal_rollup(yt_clean).assign(platform="YouTube"), signal_rollup(rd_clean).assign(platform="Reddit")],
+              ignore_index=True).to_csv(trend_path, index=False)
 
     # 4) Append to Google Sheets
     try:
@@ -57,7 +89,7 @@ def main():
             "reddit":  "top(month) across subs, top quartile by score, ≤2 posts"
         },
         "caps": {"max_comments_per_post": 300, "max_posts_per_source": 2},
-        "filters": {"window_days": 60, "lang_en_ascii_ratio": ">0.95", "toxicity_max": 0.30, "ed_min": 0.20, "must_have": "≥1 marketing signal OR hashtag"}
+        "filters": {"window_days": 60, "lang_en_ascii_ratio": ">0.95", "toxicity_max": 0.30, "ed_min": 0.20, "must_have": "≥1 marketing signal OR hashtag", "near_dup_jaccard": NEAR_DUP_THRESHOLD}
     }
     man_path = os.path.join(DATA, "source_manifest.json")
     with open(man_path,"w",encoding="utf-8") as f:
@@ -67,8 +99,9 @@ def main():
     print("SUMMARY")
     print(f" - Raw:   {yt_path} rows={len(yt)} | {rd_path} rows={len(rd)}")
     print(f" - Clean: {cy_path} rows={len(yt_clean)} | {cr_path} rows={len(rd_clean)} | {ca_path} rows={len(all_clean)}")
-    print(f" - KPI:   {kpi_path} | rows=2 | {sheets_msg}")
+    print(f" - KPI:   {kpi_path} | rows=2 | {sheets_msg} | trends: {trend_path}")
     print(f" - Logs:  {dq_path}, {man_path}")
+    print(f" - Archive: {archive_msg}")
 
 if __name__ == "__main__":
     main()
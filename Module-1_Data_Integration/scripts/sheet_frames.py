@@ -0,0 +1,100 @@
+# scripts/sheet_frames.py
+"""
+Load several tabs at once straight into typed DataFrames.
+
+On Google Sheets all tabs come from one values.batchGet (local snapshots
+are reused when current); other TABLE_STORE backends hand over each tab's
+text grid. Columns declared in the tab's schema are decoded once here,
+so callers do not rebuild dicts or re-parse created_utc themselves:
+
+    frames = load_frames(["TOPICS_SUMMARY", "SENTIMENT"])
+    frames["SENTIMENT"]["created_utc"]   # datetime64[ns, UTC]
+
+Undeclared columns are numericised the way get_all_records() does it: an
+all-number column becomes Int64 / float64, a mixed one holds numbers and
+text cell by cell.
+"""
+import pandas as pd
+from gspread.utils import numericise
+
+import sheets_utils
+
+# column -> int | float | ts (UTC) | category | str
+TAB_SCHEMAS = {
+    "ALL_COMMENTS": {
+        "platform": "category", "source": "category", "comment_id": "str", "comment": "str",
+        "likes_or_score": "int", "reply_count": "int", "created_utc": "ts",
+    },
+    "SENTIMENT": {
+        "comment": "str", "neg": "float", "neu": "float", "pos": "float", "compound": "float",
+        "sentiment_label": "category", "source": "category", "created_utc": "ts",
+    },
+    "TOPICS": {
+        "topic": "int", "topic_prob": "float", "topic_name": "category", "document": "str",
+        "source": "category", "created_utc": "ts",
+    },
+    "TOPICS_SUMMARY": {
+        "Topic": "int", "Count": "int", "Name": "str", "Representative_Docs": "str", "created_utc": "ts",
+    },
+}
+
+def _numbers(col):
+    # FORMATTED_VALUE cells may carry thousands separators
+    return pd.to_numeric(col.astype(str).str.replace(",", "", regex=False), errors="coerce")
+
+def _utc(col):
+    text = col.astype(str)
+    ts = pd.to_datetime(text, errors="coerce", utc=True, format="ISO8601")
+    odd = ts.isna() & text.ne("")
+    if odd.any():  # whatever display format Sheets chose for parsed dates
+        ts[odd] = pd.to_datetime(text[odd], errors="coerce", utc=True, format="mixed")
+    return ts
+
+DECODERS = {
+    "int":      lambda c: _numbers(c).round().astype("Int64"),
+    "float":    lambda c: _numbers(c).astype("float64"),
+    "ts":       _utc,
+    "category": lambda c: c.astype(str).astype("category"),
+    "str":      lambda c: c.astype(str),
+}
+
+def _numericised(col):
+    """get_all_records() numericising for an undeclared text column."""
+    text = col.astype(str)
+    filled = text.ne("")
+    nums = pd.to_numeric(text.where(filled & ~text.str.contains("_", regex=False))
+                         .str.replace(",", "", regex=False), errors="coerce")
+    if not filled.any() or nums[filled].isna().any():
+        return col if not filled.any() else col.map(numericise)  # text, or mixed cell by cell
+    integral = ~text[filled].str.contains(r"[.eE]|inf|nan", case=False, regex=True)
+    return nums.round().astype("Int64") if integral.all() else nums.astype("float64")
+
+def decode(df, schema):
+    """Apply a {column: type} schema to the columns df has; numericise the rest."""
+    schema = schema or {}
+    for col in df.columns:
+        df[col] = DECODERS[schema[col]](df[col]) if col in schema else _numericised(df[col])
+    return df
+
+def grid_frame(grid):
+    """Raw cell grid (header first, rows possibly ragged) -> text DataFrame."""
+    if not grid or not grid[0]:
+        return pd.DataFrame()
+    header, width = grid[0], len(grid[0])
+    body = [(r + [""] * (width - len(r)))[:width] for r in grid[1:]]
+    df = pd.DataFrame(body, columns=header, dtype=object)
+    # get_all_records semantics: with duplicate headers the last column wins
+    return df.loc[:, ~df.columns.duplicated(keep="last")]
+
+def load_frames(names, schemas=None):
+    """{tab: DataFrame} for the given tabs; schemas override TAB_SCHEMAS per tab."""
+    schemas = {**TAB_SCHEMAS, **(schemas or {})}
+    store = sheets_utils.local_store()
+    if store is None:
+        frames = {n: grid_frame(g) for n, g in sheets_utils.sheets_get_grids(names).items()}
+    else:
+        frames = {n: grid_frame(store.get_grid(n)) for n in dict.fromkeys(names)}
+    return {n: decode(df, schemas.get(n)) for n, df in frames.items()}
+
+def load_frame(name, schema=None):
+    return load_frames([name], {name: schema} if schema else None)[name]
@@ -1,43 +1,356 @@
 # sheets_utils.py
-import os, time, json
+import os, time, json, atexit, hashlib, threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from pathlib import Path
 load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env")
 
+import table_store
+from append_queue import AppendQueue
 import gspread
+from gspread.utils import rowcol_to_a1, numericise_all, to_records
 from google.oauth2.service_account import Credentials
 
+try:  # local tab snapshots are columnar (Parquet); without pyarrow they are just skipped
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
 GSHEET_ID = os.getenv("GSHEET_ID")
+# where get_all_rows / write_rows / append_row / update_cell go: sheets | sqlite | parquet
+TABLE_STORE = os.getenv("TABLE_STORE", "sheets").strip().lower()
+PRINT_STATS = os.getenv("SHEETS_STATS", "0") in ("1","true","True","yes","YES")
+
+# write_rows: rows per batchUpdate request, parallel requests, local row fingerprints
+WRITE_CHUNK_ROWS = int(os.getenv("SHEETS_WRITE_CHUNK_ROWS", "2000"))
+WRITE_WORKERS    = max(1, int(os.getenv("SHEETS_WRITE_WORKERS", "4")))
+STATE_DIR        = Path(os.getenv("SHEETS_STATE_DIR", "data/state/sheets"))
+
+# get_all_rows: local snapshot per tab, revalidated against that tab's version token
+SNAPSHOTS        = pq is not None and os.getenv("SHEETS_SNAPSHOTS", "1") in ("1","true","True","yes","YES")
+REVISION_TTL     = float(os.getenv("SHEETS_REVISION_TTL", "5"))  # seconds to trust a tab-version lookup
+SNAPSHOT_MAX_AGE = float(os.getenv("SHEETS_SNAPSHOT_MAX_AGE", "900"))  # hand edits are seen after this
+VERSION_KEY      = "etl_version"  # per-tab developer metadata, bumped by every write made here
+
+# append_row: write-behind queue (bulk appends per tab, journaled under STATE_DIR/appends)
+WRITE_BEHIND     = os.getenv("SHEETS_WRITE_BEHIND", "0") in ("1","true","True","yes","YES")
+FLUSH_SECONDS    = float(os.getenv("SHEETS_FLUSH_SECONDS", "2"))
+FLUSH_ROWS       = int(os.getenv("SHEETS_FLUSH_ROWS", "100"))
+
+# ---- process-wide handles: one client, one spreadsheet, worksheets by title
+_lock = threading.RLock()
+_client = None
+_book = None
+_worksheets = {}
+_stats = {}  # op -> [calls, seconds]
+_snap_stats = {"hit": 0, "miss": 0}
+_revision_memo = [None, 0.0]  # {tab: version token}, looked up at (monotonic)
+_store = None  # local table_store backend when TABLE_STORE != sheets
+_queue = None  # AppendQueue, created on first use
+
+@contextmanager
+def _timed(op):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            st = _stats.setdefault(op, [0, 0.0])
+            st[0] += 1
+            st[1] += time.perf_counter() - t0
+
+def sheets_stats():
+    """{op: (calls, seconds)} for every Sheets API operation made by this process."""
+    with _lock:
+        return {op: (n, round(sec, 3)) for op, (n, sec) in _stats.items()}
+
+def report_stats():
+    st = sheets_stats()
+    calls = sum(n for n, _ in st.values())
+    secs = sum(sec for _, sec in st.values())
+    parts = " ".join(f"{op}={n}/{sec:.2f}s" for op, (n, sec) in sorted(st.items()))
+    snaps = f" | snapshots hit={_snap_stats['hit']} miss={_snap_stats['miss']}" if SNAPSHOTS else ""
+    return f"api_calls={calls} api_time={secs:.2f}s{snaps} | {parts}"
+
+if PRINT_STATS:
+    atexit.register(lambda: print("[sheets_utils]", report_stats()))
 
 def gc():
-    creds = Credentials.from_service_account_file(
-        str(Path(__file__).resolve().parents[1] / "service_account.json"),
-        scopes=["https://www.googleapis.com/auth/spreadsheets"]
-    )
-    return gspread.authorize(creds)
+    """
+    Authorized client, created once per process. gspread's authorized session
+    refreshes the service-account token by itself when it expires.
+    """
+    global _client
+    with _lock:
+        if _client is None:
+            with _timed("authorize"):
+                creds = Credentials.from_service_account_file(
+                    str(Path(__file__).resolve().parents[1] / "service_account.json"),
+                    scopes=["https://www.googleapis.com/auth/spreadsheets"]
+                )
+                _client = gspread.authorize(creds)
+        return _client
+
+def get_book():
+    """The GSHEET_ID spreadsheet handle, opened once per process."""
+    global _book
+    with _lock:
+        if _book is None:
+            client = gc()
+            with _timed("open_by_key"):
+                _book = client.open_by_key(GSHEET_ID)
+        return _book
+
+def _worksheet(name):
+    """Cached worksheet handle by title; raises gspread.WorksheetNotFound."""
+    with _lock:
+        ws = _worksheets.get(name)
+    if ws is None:
+        wb = get_book()
+        with _timed("worksheet"):
+            ws = wb.worksheet(name)
+        with _lock:
+            _worksheets[name] = ws
+    return ws
+
+def _forget_worksheet(name):
+    with _lock:
+        _worksheets.pop(name, None)
 
 def get_sheet(name="WROTE_CLEAN_ALL"):
-    wb = gc().open_by_key(GSHEET_ID)
     try:
-        return wb.worksheet(name)
+        return _worksheet(name)
     except Exception:
-        wss = wb.worksheets()
+        wb = get_book()
+        with _timed("worksheets"):
+            wss = wb.worksheets()
         if wss:
             print(f"Warning: worksheet '{name}' not found. Using first worksheet '{wss[0].title}'.")
             return wss[0]
-        return wb.add_worksheet(title=name, rows="1000", cols="20")
+        with _timed("add_worksheet"):
+            ws = wb.add_worksheet(title=name, rows="1000", cols="20")
+        with _lock:
+            _worksheets[name] = ws
+        return ws
 
-def get_all_rows(name="WROTE_CLEAN_ALL"):
+# ---- local tab snapshots
+# A snapshot (and a write's row fingerprints) is keyed on its own tab's version
+# token: [sheetId, rows, cols, etl_version]. Every write made here bumps the
+# tab's etl_version developer metadata after the data is in, so a write to one
+# tab leaves every other tab's snapshot valid. Edits made by hand (or by a
+# client that does not bump the version) and that keep the grid size are only
+# seen once the snapshot is SHEETS_SNAPSHOT_MAX_AGE seconds old.
+def _read_revision():
+    """{tab title: version token} for every tab in one metadata call, or None when it cannot be read."""
+    wb = get_book()
+    try:
+        with _timed("fetch_sheet_metadata"):
+            meta = wb.fetch_sheet_metadata(params={"fields": (
+                "sheets(properties(sheetId,title,gridProperties(rowCount,columnCount)),"
+                "developerMetadata(metadataKey,metadataValue))")})
+    except Exception as e:
+        print(f"[sheets_utils] cannot read tab versions ({e})")
+        return None
+    out = {}
+    for sh in meta.get("sheets", []):
+        props = sh.get("properties", {})
+        grid = props.get("gridProperties", {})
+        version = next((m.get("metadataValue", "") for m in sh.get("developerMetadata", [])
+                        if m.get("metadataKey") == VERSION_KEY), "")
+        out[props.get("title")] = [props.get("sheetId"), grid.get("rowCount"), grid.get("columnCount"), version]
+    return out
+
+def _revision(name, fresh=False):
+    """Version token of tab `name` for the snapshots (memoized for REVISION_TTL); None if unknown or off."""
+    global SNAPSHOTS
+    if not SNAPSHOTS:
+        return None
+    with _lock:
+        revs, at = _revision_memo
+        if not fresh and revs is not None and time.monotonic() - at < REVISION_TTL:
+            return revs.get(name)
+    revs = _read_revision()
+    if revs is None:
+        print("[sheets_utils] snapshots disabled")
+        SNAPSHOTS = False
+        return None
+    with _lock:
+        _revision_memo[:] = [revs, time.monotonic()]
+    return revs.get(name)
+
+def _bump_version(ws):
+    """New etl_version token on the tab (after its data changed); returns the token, None on failure."""
+    token = f"{time.time_ns():x}.{os.getpid()}"
+    lookup = {"developerMetadataLookup": {"metadataKey": VERSION_KEY, "metadataLocation": {"sheetId": ws.id}}}
+    wb = get_book()
+    try:
+        with _timed("batch_update"):
+            resp = wb.batch_update({"requests": [{"updateDeveloperMetadata": {
+                "dataFilters": [lookup], "developerMetadata": {"metadataValue": token}, "fields": "metadataValue"}}]})
+        if not ((resp.get("replies") or [{}])[0].get("updateDeveloperMetadata") or {}).get("developerMetadata"):
+            with _timed("batch_update"):  # first write through here: the tab has no version yet
+                wb.batch_update({"requests": [{"createDeveloperMetadata": {"developerMetadata": {
+                    "metadataKey": VERSION_KEY, "metadataValue": token,
+                    "location": {"sheetId": ws.id}, "visibility": "DOCUMENT"}}}]})
+    except Exception as e:
+        print(f"[sheets_utils] {ws.title}: tab version not bumped ({e}); other processes may serve a stale snapshot")
+        return None
+    with _lock:
+        _revision_memo[1] = 0.0  # our own lookup is stale now
+    return token
+
+def _wrote(name, ws):
+    """After any write to a tab: new version, and our fingerprints / snapshot of it are void."""
+    _bump_version(ws)
+    _fp_path(name).unlink(missing_ok=True)
+    _drop_snapshot(name)
+
+def _snap_paths(name):
+    base = _fp_path(name).name.replace(".fingerprints.json", "")
+    return STATE_DIR / f"{base}.snapshot.parquet", STATE_DIR / f"{base}.snapshot.json"
+
+def _load_snapshot(name, rev):
+    """Cell grid (header first) if the snapshot was taken at tab version `rev` and is not too old."""
+    data_p, meta_p = _snap_paths(name)
+    try:
+        with open(meta_p, encoding="utf8") as fh:
+            meta = json.load(fh)
+        if meta.get("rev") != rev or time.time() - meta.get("saved", 0) > SNAPSHOT_MAX_AGE:
+            return None
+        table = pq.read_table(data_p)
+    except (OSError, ValueError):
+        return None
+    cols = [c.to_pylist() for c in table.columns]
+    return [list(table.column_names)] + [list(r) for r in zip(*cols)]
+
+def _save_snapshot(name, grid, rev):
+    if not SNAPSHOTS or not rev or not grid or not grid[0]:
+        return
+    header, body = [str(h) for h in grid[0]], grid[1:]
+    width = len(header)
+    cols = [pa.array([(_cell_text(r[i]) if i < len(r) else "") for r in body], type=pa.string())
+            for i in range(width)]
+    data_p, meta_p = _snap_paths(name)
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    pq.write_table(pa.Table.from_arrays(cols, names=header), data_p.with_suffix(".tmp"))
+    os.replace(data_p.with_suffix(".tmp"), data_p)
+    with open(meta_p, "w", encoding="utf8") as fh:
+        json.dump({"rev": rev, "saved": time.time()}, fh)
+
+def _drop_snapshot(name):
+    for p in _snap_paths(name):
+        p.unlink(missing_ok=True)
+
+def _records(grid):
+    """Same records as Worksheet.get_all_records() from a raw cell grid."""
+    if not grid or grid == [[]]:
+        return []
+    return to_records(grid[0], [numericise_all(row) for row in grid[1:]])
+
+def sheets_get_all_rows(name="WROTE_CLEAN_ALL"):
+    """get_all_rows against Google Sheets, whatever TABLE_STORE says."""
+    rev = _revision(name)
+    if rev:
+        grid = _load_snapshot(name, rev)
+        if grid is not None:
+            _snap_stats["hit"] += 1
+            return _records(grid)
+        _snap_stats["miss"] += 1
     ws = get_sheet(name)
-    return ws.get_all_records()
+    with _timed("get_values"):
+        grid = ws.get(pad_values=True)
+    if rev and ws.title == name:
+        _save_snapshot(name, grid, rev)
+    return _records(grid)
 
-def update_cell(name, row, col, val):
+def sheets_get_grids(names):
+    """
+    {name: raw cell grid (header first)} for several tabs in one values.batchGet;
+    tabs with a current snapshot are served locally, missing tabs come back empty.
+    """
+    revs = {n: _revision(n) for n in dict.fromkeys(names)}
+    grids, fetch = {}, []
+    for n, rev in revs.items():
+        grid = _load_snapshot(n, rev) if rev else None
+        if grid is None:
+            fetch.append(n)
+        else:
+            grids[n] = grid
+        if rev:
+            _snap_stats["hit" if grid is not None else "miss"] += 1
+    if fetch:
+        wb = get_book()
+        try:
+            with _timed("values_batch_get"):
+                resp = wb.values_batch_get(["'" + n.replace("'", "''") + "'" for n in fetch])
+        except gspread.exceptions.APIError:
+            # one unknown tab fails the whole batch: retry with the tabs that exist
+            with _timed("worksheets"):
+                titles = {ws.title for ws in wb.worksheets()}
+            known = [n for n in fetch if n in titles]
+            grids.update({n: [] for n in fetch if n not in titles})
+            if not known:
+                return {n: grids[n] for n in dict.fromkeys(names)}
+            fetch = known
+            with _timed("values_batch_get"):
+                resp = wb.values_batch_get(["'" + n.replace("'", "''") + "'" for n in fetch])
+        for n, vr in zip(fetch, resp.get("valueRanges", [])):
+            grids[n] = vr.get("values", [])
+            if revs[n]:
+                _save_snapshot(n, grids[n], revs[n])
+    return {n: grids[n] for n in dict.fromkeys(names)}
+
+def sheets_update_cell(name, row, col, val):
     ws = get_sheet(name)
-    ws.update_cell(row, col, val)
+    with _timed("update_cell"):
+        ws.update_cell(row, col, val)
+    _wrote(name, ws)
 
-def append_row(name, row_vals):
+def sheets_append_row(name, row_vals):
+    ws = get_sheet(name)
+    with _timed("append_row"):
+        ws.append_row(row_vals)
+    _wrote(name, ws)
+
+def sheets_append_rows(name, rows, value_input_option="RAW"):
+    """All rows in one values.append request."""
+    rows = [list(r) for r in rows]
+    if not rows:
+        return
     ws = get_sheet(name)
-    ws.append_row(row_vals)
+    with _timed("append_rows"):
+        ws.append_rows(rows, value_input_option=value_input_option)
+    _wrote(name, ws)
+
+def sheets_insert_rows(name, rows, at, value_input_option="RAW"):
+    """Insert rows so the first lands on sheet row `at` (1-based); rows below shift down."""
+    rows = [list(r) for r in rows]
+    if not rows:
+        return
+    ws = get_sheet(name)
+    with _timed("insert_rows"):
+        ws.insert_rows(rows, row=at, value_input_option=value_input_option)
+    _wrote(name, ws)  # row positions moved under the write fingerprints
+
+def sheets_delete_rows(name, start, end):
+    """Delete sheet rows start..end (1-based, inclusive) in one request."""
+    ws = get_sheet(name)
+    with _timed("delete_rows"):
+        ws.delete_rows(start, end)
+    _wrote(name, ws)
+
+def sheets_row_count(name):
+    """Rows in the tab's grid (header included) from fresh spreadsheet metadata; None if no such tab."""
+    wb = get_book()
+    with _timed("fetch_sheet_metadata"):
+        meta = wb.fetch_sheet_metadata()
+    for sh in meta.get("sheets", []):
+        props = sh.get("properties", {})
+        if props.get("title") == name:
+            return props.get("gridProperties", {}).get("rowCount")
+    return None
 
 def _safe_value(v):
     # Convert list/dict/NaN -> string so Google Sheets accepts it as single cell
@@ -53,24 +366,83 @@ def _safe_value(v):
     except Exception:
         return str(v)
 
-def write_rows(name, header, rows):
+def _cell_text(v):
+    """How a written value reads back from Sheets, for fingerprinting."""
+    if isinstance(v, bool):
+        return "TRUE" if v else "FALSE"
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return "" if v is None else str(v)
+
+def _fingerprint(row):
+    blob = json.dumps([_cell_text(v) for v in row], ensure_ascii=False)
+    return hashlib.blake2b(blob.encode("utf8"), digest_size=8).hexdigest()
+
+def _fp_path(name):
+    """Fingerprint file of a tab; also the base name of its snapshot files."""
+    safe = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in name)
+    if safe != name:  # keep "A B" and "A_B" apart
+        safe += "-" + hashlib.blake2b(name.encode("utf8"), digest_size=4).hexdigest()
+    return STATE_DIR / f"{safe}.fingerprints.json"
+
+def _load_fingerprints(name, ws, width, rev):
+    """
+    (fingerprints of the rows currently in the tab, time they were last read back):
+    from our last write while the tab is still at the version that write left it
+    at and the read-back is under SHEETS_SNAPSHOT_MAX_AGE old, else read back now.
+    """
+    try:
+        with open(_fp_path(name), encoding="utf8") as fh:
+            saved = json.load(fh)
+        if (rev and saved.get("rev") == rev and saved.get("sheet_id") == ws.id
+                and saved.get("cols") == width and ws.row_count == len(saved["fp"])
+                and time.time() - saved.get("saved", 0) <= SNAPSHOT_MAX_AGE):
+            return saved["fp"], saved["saved"]
+    except (OSError, ValueError, KeyError):
+        pass
+    with _timed("get_all_values"):
+        existing = ws.get_all_values()
+    return [_fingerprint((list(r) + [""] * width)[:width]) for r in existing], time.time()
+
+def _save_fingerprints(name, ws, width, fps, rev, since):
+    if not rev:
+        return  # nothing to revalidate them against
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = _fp_path(name).with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf8") as fh:
+        json.dump({"rev": rev, "saved": since, "sheet_id": ws.id, "cols": width, "fp": fps}, fh)
+    os.replace(tmp, _fp_path(name))
+
+def _changed_ranges(old_fp, new_fp, chunk_rows):
+    """0-based [start, end) row ranges whose fingerprints differ, split to <= chunk_rows."""
+    out, start = [], None
+    for i, fp in enumerate(new_fp + [None]):
+        same = fp is None or (i < len(old_fp) and old_fp[i] == fp)
+        if not same and start is None:
+            start = i
+        elif same and start is not None:
+            for a in range(start, i, chunk_rows):
+                out.append((a, min(i, a + chunk_rows)))
+            start = None
+    return out
+
+def sheets_write_rows(name, header, rows, value_input_option="USER_ENTERED"):
     """
-    Replace worksheet contents (fast bulk update).
+    Replace worksheet contents in place.
     header: list of column names
     rows: list of lists/iterables (length should match header)
+    value_input_option: RAW stores the cells as sent ("007" stays text)
+
+    Only rows whose fingerprint changed since the last write are sent, as
+    chunked values.batchUpdate calls run in parallel; the grid is resized in
+    place, so the tab never disappears mid-write.
     """
-    wb = gc().open_by_key(GSHEET_ID)
+    wb = get_book()
+    # saved fingerprints are only trusted at a known revision, and the revision is
+    # only looked up for the snapshots; without them the tab is read back instead
+    rev_before = _revision(name, fresh=True)
     try:
-        # remove existing sheet to avoid type/range issues
-        try:
-            ws = wb.worksheet(name)
-            wb.del_worksheet(ws)
-        except Exception:
-            pass
-        # create new
-        rows_count = max(2, len(rows) + 1)
-        ws = wb.add_worksheet(title=name, rows=str(rows_count + 10), cols=str(max(10, len(header))))
-        # convert rows to strings and bulk update at A1
+        # convert rows to cell values (header first)
         values = []
         values.append([_safe_value(h) for h in header])
         for r in rows:
@@ -80,11 +452,125 @@ def write_rows(name, header, rows):
             else:
                 row_vals = [_safe_value(v) for v in r]
             values.append(row_vals)
-        # bulk write
-        ws.update("A1", values, value_input_option="USER_ENTERED")
+        width = max(1, max(len(v) for v in values))  # an empty table still keeps one (blank) column
+        values = [v + [""] * (width - len(v)) for v in values]
+
+        try:
+            ws = _worksheet(name)
+            old_fp, since = _load_fingerprints(name, ws, width, rev_before)
+        except gspread.WorksheetNotFound:
+            with _timed("add_worksheet"):
+                ws = wb.add_worksheet(title=name, rows=str(len(values)), cols=str(width))
+            with _lock:
+                _worksheets[name] = ws
+            old_fp, since = [], time.time()
+
+        new_fp = [_fingerprint(v) for v in values]
+        # a write that dies halfway must not leave trusted fingerprints / snapshots behind
+        _fp_path(name).unlink(missing_ok=True)
+        _drop_snapshot(name)
+
+        resized = ws.row_count != len(values) or ws.col_count != width
+        if resized:
+            with _timed("resize"):
+                ws.resize(rows=len(values), cols=width)
+
+        quoted = "'" + name.replace("'", "''") + "'"
+        data = [{"range": f"{quoted}!{rowcol_to_a1(a + 1, 1)}", "values": values[a:b]}
+                for a, b in _changed_ranges(old_fp, new_fp, WRITE_CHUNK_ROWS)]
+
+        def send(item):
+            with _timed("values_batch_update"):
+                wb.values_batch_update({"valueInputOption": value_input_option, "data": [item]})
+
+        if data:
+            with ThreadPoolExecutor(max_workers=min(WRITE_WORKERS, len(data))) as pool:
+                list(pool.map(send, data))
+        rev_after = rev_before
+        if data or resized:
+            token = _bump_version(ws)
+            rev_after = [ws.id, len(values), width, token] if token and SNAPSHOTS else None
+        _save_fingerprints(name, ws, width, new_fp, rev_after, since)
+        # USER_ENTERED may reformat what we sent (dates, numbers), so this tab's snapshot
+        # stays dropped and it is re-read on next use; other tabs' snapshots are untouched
+        print(f"[sheets_utils] {name}: {sum(len(d['values']) for d in data)}/{len(values)} rows rewritten "
+              f"in {len(data)} request(s)")
     except Exception as e:
         raise RuntimeError(f"write_rows failed: {e}")
 
+# ---- public API: Google Sheets by default, a local table_store backend otherwise
+def local_store():
+    """The table_store backend selected by TABLE_STORE, or None for Google Sheets."""
+    global _store
+    if TABLE_STORE == "sheets":
+        return None
+    with _lock:
+        if _store is None:
+            _store = table_store.open_store(TABLE_STORE)
+    return _store
+
+def get_all_rows(name="WROTE_CLEAN_ALL"):
+    store = local_store()
+    return sheets_get_all_rows(name) if store is None else store.get_all_rows(name)
+
+def write_rows(name, header, rows):
+    store = local_store()
+    if store is None:
+        return sheets_write_rows(name, header, rows)
+    try:
+        store.write_rows(name, header, rows)
+    except Exception as e:
+        raise RuntimeError(f"write_rows failed: {e}")
+
+def get_rows_since(name, column, start):
+    """
+    get_all_rows limited to rows whose `column` (an ISO date/time) is >= start
+    ('YYYY-MM-DD...'); the SQLite store answers it from its index.
+    """
+    store = local_store()
+    if store is not None:
+        return store.rows_since(name, column, start)
+    return [r for r in sheets_get_all_rows(name) if str(r.get(column, "")) >= start]
+
+def get_grid_since(name, column, start):
+    """
+    get_rows_since as a text grid (header first), cells exactly as stored:
+    nothing is numericised, so ids like "1e5" or "0012" come back unchanged.
+    """
+    store = local_store()
+    if store is not None:
+        return store.grid_since(name, column, start)
+    grid = sheets_get_grids([name]).get(name) or []
+    if not grid or column not in grid[0]:
+        return grid
+    i = grid[0].index(column)
+    return [grid[0]] + [r for r in grid[1:] if (r[i] if i < len(r) else "") >= str(start)]
+
+def append_rows(name, rows):
+    """Append many rows to one tab in a single request (no write-behind)."""
+    store = local_store()
+    return sheets_append_rows(name, rows) if store is None else store.append_rows(name, rows)
+
+def write_behind():
+    """Process-wide write-behind queue; rows put() on it reach the tab via append_rows."""
+    global _queue
+    with _lock:
+        if _queue is None:
+            _queue = AppendQueue(append_rows, STATE_DIR / "appends",
+                                 interval=FLUSH_SECONDS, max_rows=FLUSH_ROWS)
+    return _queue
+
+def append_row(name, row_vals):
+    if WRITE_BEHIND:
+        write_behind().put(name, row_vals)
+        return
+    store = local_store()
+    return sheets_append_row(name, row_vals) if store is None else store.append_row(name, row_vals)
+
+def update_cell(name, row, col, val):
+    store = local_store()
+    return sheets_update_cell(name, row, col, val) if store is None else store.update_cell(name, row, col, val)
+
 
 
 '''# sheets_utils.py
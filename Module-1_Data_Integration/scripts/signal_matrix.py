@@ -0,0 +1,106 @@
+# scripts/signal_matrix.py
+"""
+Sparse multi-hot view of the marketing_signals / hashtags columns.
+
+apply_filters builds it once from the lists it already has and keeps it in
+df.attrs["signal_matrix"]; KPIs and rollups then become column sums and
+sparse mat-vecs instead of json.loads + explode per row. A frame without an
+aligned matrix (read back from CSV, filtered afterwards, concatenated) gets
+one built from its JSON columns on demand.
+
+Columns are a sorted vocabulary, so the layout does not depend on set order.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from scripts.utils import LEXICON
+
+ATTR = "signal_matrix"
+
+class SignalMatrix:
+    """rows x vocabulary 0/1 matrices for signals (S) and hashtags (H), tied to a row index."""
+    def __init__(self, index, signals, S, hashtags, H):
+        self.index = np.asarray(index)
+        self.signals, self.S = signals, S.tocsr()
+        self.hashtags, self.H = hashtags, H.tocsr()
+
+    # immutable: let pandas' attrs propagation share it instead of deep-copying
+    def __deepcopy__(self, memo):
+        return self
+
+    def aligned(self, df):
+        return len(self.index) == len(df) and np.array_equal(self.index, df.index.to_numpy())
+
+    def take(self, positions):
+        """The matrix for a row subset (df.iloc[positions]); the vocabulary is kept."""
+        return SignalMatrix(self.index[positions], self.signals, self.S[positions], self.hashtags, self.H[positions])
+
+def _multi_hot(lists, vocab=None):
+    vocab = sorted({x for l in lists for x in l}) if vocab is None else vocab
+    col = {v: j for j, v in enumerate(vocab)}
+    indptr, indices = [0], []
+    for l in lists:
+        indices.extend(col[x] for x in l)
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.int8)
+    return vocab, sparse.csr_matrix((data, np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+                                    shape=(len(lists), len(vocab)))
+
+def build_matrix(index, signal_lists, hashtag_lists):
+    signals, S = _multi_hot(signal_lists)
+    hashtags, H = _multi_hot(hashtag_lists)
+    return SignalMatrix(index, signals, S, hashtags, H)
+
+def signal_matrix(df):
+    """The frame's aligned matrix, or one built from its JSON columns."""
+    m = df.attrs.get(ATTR)
+    if isinstance(m, SignalMatrix) and m.aligned(df):
+        return m
+    def lists(col):
+        if col not in df.columns:
+            return [[] for _ in range(len(df))]
+        return [json.loads(v) if isinstance(v, str) and v else (list(v) if isinstance(v, list) else [])
+                for v in df[col].tolist()]
+    return build_matrix(df.index, lists("marketing_signals"), lists("hashtags"))
+
+def signal_rank(signals):
+    """Tie-break order inside a row: lexicon order (as marketing_signals lists them), unknown last."""
+    sig = LEXICON.categories.index("signal") if "signal" in LEXICON.categories else -1
+    order = {}
+    for i, (p, c) in enumerate(zip(LEXICON.phrases, LEXICON.category_of)):
+        if c == sig:
+            order.setdefault(p, i)
+    return np.asarray([order.get(s, len(order)) for s in signals])
+
+def first_seen_order(m):
+    """Signal column indices with at least one hit, in the order a row-by-row scan meets them."""
+    csc = m.S.tocsc()
+    hit = np.flatnonzero(np.diff(csc.indptr))
+    first_row = np.asarray([csc.indices[csc.indptr[j]:csc.indptr[j + 1]].min() for j in hit])
+    rank = signal_rank([m.signals[j] for j in hit])
+    return hit[np.lexsort((rank, first_row))]
+
+def signal_rollup(df, kind="signals"):
+    """
+    Per-signal (or per-hashtag) rollup: comments, mean engagement density and
+    positivity (share with sentiment_score > 0.2), most frequent first.
+    A collapsed row counts dup_count times, as in kpi_partials.
+    """
+    m = signal_matrix(df)
+    vocab, X = (m.signals, m.S) if kind == "signals" else (m.hashtags, m.H)
+    cols = ["signal" if kind == "signals" else "hashtag", "comments", "avg_engagement", "positivity"]
+    if not len(vocab):
+        return pd.DataFrame(columns=cols)
+    w = (pd.to_numeric(df["dup_count"], errors="coerce").fillna(1).to_numpy(dtype="float64")
+         if "dup_count" in df.columns else np.ones(len(df)))
+    XT = X.T.tocsr().astype(np.float64)
+    n = XT @ w
+    ed = XT @ (df["engagement_density"].to_numpy(dtype="float64") * w)
+    pos = XT @ ((df["sentiment_score"].to_numpy(dtype="float64") > 0.2) * w)
+    out = pd.DataFrame({cols[0]: vocab, "comments": n.round().astype("int64"), "avg_engagement": ed / np.maximum(n, 1),
+                        "positivity": pos / np.maximum(n, 1)})
+    out = out[out["comments"] > 0]
+    return out.sort_values(["comments", cols[0]], ascending=[False, True], kind="stable").reset_index(drop=True)
@@ -4,7 +4,7 @@ import os, json, hmac, hashlib, time
 from dotenv import load_dotenv
 from pathlib import Path
 load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env")
-from sheets_utils import append_row
+from sheets_utils import write_behind
 
 SLACK_SIGNING_SECRET = os.getenv("SLACK_SIGNING_SECRET","")
 app = Flask(__name__)
@@ -32,7 +32,8 @@ def interact():
     action = payload.get("actions",[{}])[0]
     value = action.get("value","")
     topic, variant = value.split("||") if "||" in value else (value, "")
-    append_row("Approvals", [user, topic, variant])
+    # write-behind: Sheets latency and quota stay off the Slack request path
+    write_behind().put("Approvals", [user, topic, variant])
     return jsonify({"response_type":"ephemeral","text":f"Recorded approval for {variant} on {topic}."})
 
 if __name__ == "__main__":
@@ -0,0 +1,372 @@
+# scripts/table_store.py
+"""
+Local table stores behind the sheets_utils API (get_all_rows / write_rows /
+append_row / update_cell), so the pipeline can run and be benchmarked at disk
+speed and publish to Google Sheets only when needed.
+
+    TABLE_STORE=sheets   (default) Google Sheets, as before
+    TABLE_STORE=sqlite   one SQLite file, a table per tab, indexed on
+                         comment_id / source / created_utc when present
+    TABLE_STORE=parquet  one Parquet file per tab
+
+Cells are kept as text, the way Sheets keeps them, and get_all_rows returns
+the same records Worksheet.get_all_records() would (numbers numericised,
+first row is the header). get_grid returns the text cells themselves;
+lookup / rows_since (grid_since for text cells) select rows by one column
+(by index on SQLite).
+
+Copy tabs between a local store and Sheets with:
+    python scripts/table_store.py --publish ALL_COMMENTS KPI
+    python scripts/table_store.py --pull WROTE_CLEAN_ALL
+"""
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+
+from gspread.utils import numericise_all, to_records
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only needed for TABLE_STORE=parquet
+    pa = pq = None
+
+STORE_DIR   = Path(os.getenv("TABLE_STORE_DIR", "data/store"))
+SQLITE_PATH = Path(os.getenv("TABLE_STORE_SQLITE", str(STORE_DIR / "tables.sqlite")))
+INDEXED     = ("comment_id", "source", "created_utc")
+
+def cell_text(v):
+    """A value as Sheets would store it (lists/dicts as JSON, NaN as empty)."""
+    if v is None or (isinstance(v, float) and v != v):
+        return ""
+    if isinstance(v, (list, dict)):
+        return json.dumps(v, ensure_ascii=False)
+    if isinstance(v, bool):
+        return "TRUE" if v else "FALSE"
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+def to_grid(header, rows):
+    """header + rows (lists or dicts keyed by header) -> list of text rows."""
+    grid = [[cell_text(h) for h in header]]
+    for r in rows:
+        if isinstance(r, dict):
+            grid.append([cell_text(r.get(h, "")) for h in header])
+        else:
+            grid.append([cell_text(v) for v in r])
+    return grid
+
+def records(grid):
+    """Same records as Worksheet.get_all_records() for a text grid."""
+    if not grid or not grid[0]:
+        return []
+    width = len(grid[0])
+    body = [r + [""] * (width - len(r)) for r in grid[1:]]
+    return to_records(grid[0], [numericise_all(r) for r in body])
+
+# ---------------- SQLite ----------------
+class SQLiteStore:
+    """
+    Tab -> table named after the tab with positional columns c0..cN; the
+    header lives in _tabs. Row order is insertion order (_row).
+    """
+    def __init__(self, path=SQLITE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS _tabs (name TEXT PRIMARY KEY, header TEXT NOT NULL)")
+
+    @staticmethod
+    def _table(name):
+        return '"t_' + name.replace('"', '""') + '"'
+
+    @staticmethod
+    def _index(name, col):
+        # per physical column (c<i>), hashed so no two tab names can share an index name
+        return '"ix_' + hashlib.blake2b(f"{name}\0{col}".encode("utf8"), digest_size=8).hexdigest() + '"'
+
+    def _header(self, name):
+        row = self._db.execute("SELECT header FROM _tabs WHERE name=?", (name,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def _create(self, name, header):
+        t = self._table(name)
+        cols = ", ".join(f"c{i} TEXT" for i in range(len(header)))
+        self._db.execute(f"DROP TABLE IF EXISTS {t}")
+        self._db.execute(f"CREATE TABLE {t} (_row INTEGER PRIMARY KEY{', ' + cols if cols else ''})")
+        self._db.execute("INSERT OR REPLACE INTO _tabs VALUES (?, ?)", (name, json.dumps(header)))
+        self._ensure_indexes(name, header)
+
+    def _ensure_indexes(self, name, header):
+        for h in INDEXED:
+            if h in header:
+                col = f"c{header.index(h)}"
+                self._db.execute(f"CREATE INDEX IF NOT EXISTS {self._index(name, col)} ON {self._table(name)} ({col})")
+
+    def _widen(self, name, header, width):
+        if width <= len(header):
+            return header
+        t = self._table(name)
+        for i in range(len(header), width):
+            self._db.execute(f"ALTER TABLE {t} ADD COLUMN c{i} TEXT")
+        header = header + [""] * (width - len(header))
+        self._db.execute("UPDATE _tabs SET header=? WHERE name=?", (json.dumps(header), name))
+        return header
+
+    def _insert(self, name, width, rows):
+        if not rows or not width:
+            return
+        cols = ", ".join(f"c{i}" for i in range(width))
+        marks = ", ".join("?" for _ in range(width))
+        self._db.executemany(f"INSERT INTO {self._table(name)} ({cols}) VALUES ({marks})",
+                             [(r + [""] * (width - len(r)))[:width] for r in rows])
+
+    def _select(self, name, where="", params=(), index=None):
+        """Text grid (header first) of the rows matching `where`, in row order; None if no such tab."""
+        with self._lock:
+            header = self._header(name)
+            if header is None:
+                return None
+            cols = ", ".join(f"c{i}" for i in range(len(header))) or "NULL"
+            src = self._table(name) + (f" INDEXED BY {self._index(name, index)}" if index else "")
+            body = self._db.execute(f"SELECT {cols} FROM {src} {where} ORDER BY _row",
+                                    params).fetchall()
+        return [header] + [["" if v is None else v for v in r] for r in body]
+
+    def _column(self, name, column):
+        header = self._header(name)
+        return None if header is None or column not in header else f"c{header.index(column)}"
+
+    def get_grid(self, name):
+        return self._select(name)
+
+    def get_all_rows(self, name):
+        return records(self._select(name))
+
+    def lookup(self, name, column, values):
+        """Records whose `column` cell is one of `values` (compared as text)."""
+        col, keys = self._column(name, column), [cell_text(v) for v in values]
+        if col is None or not keys:
+            return []
+        out = []
+        for at in range(0, len(keys), 500):  # stay under SQLite's bound-parameter limit
+            part = keys[at:at + 500]
+            grid = self._select(name, f"WHERE {col} IN ({', '.join('?' for _ in part)})", part)
+            out.extend(records(grid))
+        return out
+
+    def grid_since(self, name, column, start):
+        """Text grid (header first) of the rows whose `column` text is >= start (ISO dates/timestamps compare as text)."""
+        col = self._column(name, column)
+        if col is None:
+            return self.get_grid(name)
+        # without INDEXED BY the planner scans in _row order rather than sort a range
+        return self._select(name, f"WHERE {col} >= ?", (str(start),),
+                            index=col if column in INDEXED else None)
+
+    def rows_since(self, name, column, start):
+        """Records whose `column` text is >= start."""
+        return records(self.grid_since(name, column, start))
+
+    def write_rows(self, name, header, rows):
+        grid = to_grid(header, rows)
+        width = max(len(r) for r in grid)
+        head = grid[0] + [""] * (width - len(grid[0]))
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._create(name, head)
+                self._insert(name, width, grid[1:])
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def append_rows(self, name, rows):
+        grid = [[cell_text(v) for v in r] for r in rows]
+        if not grid:
+            return
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                header = self._header(name)
+                if header is None:
+                    # like an empty tab: the first appended row becomes the header
+                    header, grid = grid[0], grid[1:]
+                    self._create(name, header)
+                header = self._widen(name, header, max([len(header)] + [len(r) for r in grid]))
+                self._insert(name, len(header), grid)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def append_row(self, name, row_vals):
+        self.append_rows(name, [row_vals])
+
+    def update_cell(self, name, row, col, val):
+        """1-based row/col like gspread; row 1 is the header."""
+        with self._lock:
+            header = self._header(name)
+            if header is None:
+                self._create(name, [])
+                header = []
+            header = self._widen(name, header, col)
+            text = cell_text(val)
+            if row == 1:
+                header[col - 1] = text
+                self._db.execute("UPDATE _tabs SET header=? WHERE name=?", (json.dumps(header), name))
+                self._ensure_indexes(name, header)
+                return
+            t = self._table(name)
+            n = self._db.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+            if row - 1 > n:
+                self._insert(name, len(header), [[""] * len(header)] * (row - 1 - n))
+            self._db.execute(f"UPDATE {t} SET c{col - 1}=? WHERE _row=(SELECT _row FROM {t} "
+                             f"ORDER BY _row LIMIT 1 OFFSET ?)", (text, row - 2))
+
+    def tabs(self):
+        with self._lock:
+            return [r[0] for r in self._db.execute("SELECT name FROM _tabs ORDER BY name")]
+
+# ---------------- Parquet ----------------
+class ParquetStore:
+    """
+    Tab -> <dir>/<tab>.parquet with text columns c0..cN and the header in the
+    schema metadata. Files are immutable, so append_row / update_cell rewrite
+    the tab; use it for write_rows-heavy stages.
+    """
+    def __init__(self, root=STORE_DIR):
+        if pq is None:
+            raise SystemExit("TABLE_STORE=parquet needs the 'pyarrow' package")
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, name):
+        safe = re.sub(r"[^\w.-]", "_", name)
+        if safe != name:  # keep "A B" and "A_B" apart
+            safe += "-" + hashlib.blake2b(name.encode("utf8"), digest_size=4).hexdigest()
+        return self.root / (safe + ".parquet")
+
+    def _read(self, name):
+        path = self._path(name)
+        if not path.exists():
+            return None
+        table = pq.read_table(path)
+        header = json.loads(table.schema.metadata[b"header"])
+        cols = [c.to_pylist() for c in table.columns]
+        return [header] + [list(r) for r in zip(*cols)]
+
+    def _write(self, name, grid):
+        width = max(len(r) for r in grid)
+        header = grid[0] + [""] * (width - len(grid[0]))
+        body = [r + [""] * (width - len(r)) for r in grid[1:]]
+        arrays = [pa.array([r[i] for r in body], type=pa.string()) for i in range(width)]
+        table = pa.Table.from_arrays(arrays, names=[f"c{i}" for i in range(width)],
+                                     metadata={"header": json.dumps(header), "tab": name})
+        path = self._path(name)
+        tmp = path.with_suffix(".tmp")
+        pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, path)
+
+    def get_grid(self, name):
+        with self._lock:
+            return self._read(name)
+
+    def get_all_rows(self, name):
+        grid = self.get_grid(name)
+        return records(grid) if grid else []
+
+    def _grid_where(self, name, column, keep):
+        grid = self.get_grid(name)
+        if not grid or column not in grid[0]:
+            return grid or []
+        i = grid[0].index(column)
+        return [grid[0]] + [r for r in grid[1:] if keep(r[i] if i < len(r) else "")]
+
+    def _where(self, name, column, keep):
+        return records(self._grid_where(name, column, keep))
+
+    def lookup(self, name, column, values):
+        keys = {cell_text(v) for v in values}
+        return self._where(name, column, keys.__contains__) if keys else []
+
+    def grid_since(self, name, column, start):
+        return self._grid_where(name, column, lambda v: v >= str(start))
+
+    def rows_since(self, name, column, start):
+        return records(self.grid_since(name, column, start))
+
+    def write_rows(self, name, header, rows):
+        with self._lock:
+            self._write(name, to_grid(header, rows))
+
+    def append_rows(self, name, rows):
+        add = [[cell_text(v) for v in r] for r in rows]
+        if not add:
+            return
+        with self._lock:
+            self._write(name, (self._read(name) or []) + add)
+
+    def append_row(self, name, row_vals):
+        self.append_rows(name, [row_vals])
+
+    def update_cell(self, name, row, col, val):
+        with self._lock:
+            grid = self._read(name) or [[]]
+            while len(grid) < row:
+                grid.append([])
+            line = grid[row - 1]
+            line.extend([""] * (col - len(line)))
+            line[col - 1] = cell_text(val)
+            self._write(name, grid)
+
+    def tabs(self):
+        return sorted(pq.read_schema(p).metadata[b"tab"].decode() for p in self.root.glob("*.parquet"))
+
+BACKENDS = {"sqlite": SQLiteStore, "parquet": ParquetStore}
+
+def open_store(kind):
+    """Backend instance for TABLE_STORE=<kind> ('sheets' is handled by sheets_utils)."""
+    try:
+        return BACKENDS[kind]()
+    except KeyError:
+        raise SystemExit(f"Unknown TABLE_STORE '{kind}' (use sheets, sqlite or parquet)")
+
+if __name__ == "__main__":
+    import sys
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    import sheets_utils
+
+    parser = argparse.ArgumentParser(description="Copy tabs between the local table store and Google Sheets")
+    parser.add_argument("--store", default=os.getenv("TABLE_STORE", "sqlite"), choices=sorted(BACKENDS))
+    parser.add_argument("--publish", nargs="+", metavar="TAB", help="local -> Google Sheets")
+    parser.add_argument("--pull", nargs="+", metavar="TAB", help="Google Sheets -> local")
+    args = parser.parse_args()
+
+    store = open_store(args.store)
+    # cells go across as the text they are ("007" stays "007"), header-only tabs included
+    for tab in args.publish or []:
+        grid = store.get_grid(tab)
+        if not grid or not grid[0]:
+            print(f"[table_store] {tab} is missing locally, not published")
+            continue
+        sheets_utils.sheets_write_rows(tab, grid[0], grid[1:], value_input_option="RAW")
+        print(f"[table_store] published {tab}: {len(grid) - 1} rows")
+    for tab in args.pull or []:
+        grid = sheets_utils.sheets_get_grids([tab])[tab] or [[]]
+        store.write_rows(tab, grid[0], grid[1:])
+        print(f"[table_store] pulled {tab}: {max(0, len(grid) - 1)} rows")
+    if not (args.publish or args.pull):
+        for tab in store.tabs():
+            print(tab, len(store.get_all_rows(tab)))
@@ -0,0 +1,123 @@
+# scripts/text_quality.py
+"""
+Batch text-quality scores, shared by the crawlers and the cleaning step.
+
+A batch is encoded to UTF-8 once and scored with numpy over the bytes:
+    length     characters (bytes minus UTF-8 continuation bytes)
+    non_ascii  non-ASCII characters (UTF-8 lead bytes >= 0xC0)
+    urls       http(s):// and www. occurrences
+    repeats    characters that are the 3rd+ of a run of the same byte ("!!!!", "loooool")
+
+    q = score(texts)
+    q.ascii_ratio, q.spam, q.urls
+    english_mask(texts)      # the old per-character `ord(ch) < 128` ratio check, > 0.95
+
+Scores are kept in an LRU keyed by a blake2b hash of the text
+(TEXT_QUALITY_CACHE entries), so re-crawled or re-cleaned comments are not
+scored again. english_mask passes all-ASCII texts without scoring them.
+"""
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+CACHE_SIZE = int(os.getenv("TEXT_QUALITY_CACHE", "200000"))
+SEP = b"\x00"  # joins a batch; URL matches cannot span it
+URL_MARKS = (b"http://", b"https://", b"www.")
+
+class Scores:
+    """Per-text arrays for one batch."""
+    def __init__(self, length, non_ascii, urls, repeats):
+        self.length, self.non_ascii, self.urls, self.repeats = length, non_ascii, urls, repeats
+
+    @property
+    def ascii_ratio(self):
+        return (self.length - self.non_ascii) / np.maximum(1, self.length)
+
+    @property
+    def spam(self):
+        return self.repeats / np.maximum(1, self.length)
+
+    def english(self, thresh=0.95):
+        return (self.ascii_ratio > thresh) & (self.length > 0)
+
+_cache = OrderedDict()  # blake2b digest -> (length, non_ascii, urls, repeats)
+_lock = threading.Lock()  # crawlers score pages from several threads
+
+def _key(raw):
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+def _find_all(data, needles):
+    hits = []
+    for needle in needles:
+        i = data.find(needle)
+        while i != -1:
+            hits.append(i)
+            i = data.find(needle, i + 1)
+    return np.asarray(hits, dtype=np.int64)
+
+def _score_bytes(raws):
+    """(n, 4) int64 counts for a list of UTF-8 byte strings, one vectorized pass."""
+    n = len(raws)
+    if not n:
+        return np.zeros((0, 4), dtype=np.int64)
+    buf = np.frombuffer(SEP.join(raws), dtype=np.uint8)
+    lens = np.fromiter((len(r) for r in raws), dtype=np.int64, count=n)
+    starts = np.concatenate(([0], np.cumsum(lens + 1)[:-1]))
+    ends = starts + lens
+
+    def per_text(at):
+        # sorted byte offsets -> how many fall inside each text
+        return np.searchsorted(at, ends) - np.searchsorted(at, starts)
+
+    out = np.empty((n, 4), dtype=np.int64)
+    out[:, 0] = lens - per_text(np.flatnonzero((buf & 0xC0) == 0x80))
+    out[:, 1] = per_text(np.flatnonzero(buf >= 0xC0))
+    out[:, 2] = per_text(np.sort(_find_all(buf.tobytes().lower(), URL_MARKS)))
+    rep = (buf[2:] == buf[1:-1]) & (buf[2:] == buf[:-2]) & (buf[2:] != 0)  # NUL: the separator
+    out[:, 3] = per_text(np.flatnonzero(rep) + 2)
+    return out
+
+def score(texts):
+    """Scores for a sequence of texts (None counts as empty)."""
+    raws = [("" if t is None else str(t)).encode("utf8", "surrogatepass") for t in texts]
+    keys = [_key(r) for r in raws]
+    rows = np.empty((len(raws), 4), dtype=np.int64)
+    miss = []
+    with _lock:
+        for i, k in enumerate(keys):
+            hit = _cache.get(k)
+            if hit is None:
+                miss.append(i)
+            else:
+                _cache.move_to_end(k)
+                rows[i] = hit
+    if miss:
+        fresh = _score_bytes([raws[i] for i in miss])
+        rows[miss] = fresh
+        if CACHE_SIZE > 0:
+            with _lock:
+                for i, vals in zip(miss, fresh.tolist()):
+                    _cache[keys[i]] = tuple(vals)
+                while len(_cache) > CACHE_SIZE:
+                    _cache.popitem(last=False)
+    return Scores(rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3])
+
+def english_mask(texts, thresh=0.95):
+    """More than `thresh` of each text's characters are ASCII (empty texts are not English)."""
+    texts = ["" if t is None else str(t) for t in texts]
+    out = np.fromiter((t.isascii() for t in texts), dtype=bool, count=len(texts))
+    rest = np.flatnonzero(~out)  # all-ASCII texts pass as they are; only the rest are scored
+    if len(rest):
+        out[rest] = score([texts[i] for i in rest.tolist()]).english(thresh)
+    out &= np.fromiter((len(t) > 0 for t in texts), dtype=bool, count=len(texts))
+    return out
+
+def is_english(text, thresh=0.95):
+    if not text:
+        return False
+    if text.isascii():
+        return True
+    return bool(english_mask([text], thresh)[0])
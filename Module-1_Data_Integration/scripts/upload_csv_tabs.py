@@ -1,85 +1,242 @@
 # scripts/upload_csv_tabs.py
-import os, csv, argparse
-from typing import List
+"""
+Upload CSV snapshots to Google Sheets tabs.
+
+The CSV is streamed in UPLOAD_CHUNK_ROWS chunks (plain, .gz or .zst) into a
+staging tab, UPLOAD_WORKERS chunks in flight at a time. At the end one
+batchUpdate clears the live tab, pastes the staging values into it and
+deletes staging, so readers never see a half-empty tab and the live tab keeps
+its sheetId (formulas, charts and links pointing at it stay valid). After every chunk a checkpoint is written under
+UPLOAD_STATE_DIR; re-running the same upload after a failure skips the chunks
+already sent, as long as the CSV has not changed.
+"""
+import os, csv, json, time, hashlib, argparse, threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import sys
+SCRIPT_DIR = Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 
+from raw_sink import open_text, compression_of, stable_path
+
+CHUNK_ROWS = int(os.getenv("UPLOAD_CHUNK_ROWS", "10000"))
+WORKERS    = max(1, int(os.getenv("UPLOAD_WORKERS", "3")))
+STATE_DIR  = Path(os.getenv("UPLOAD_STATE_DIR", "data/state/uploads"))
+RETRIES    = int(os.getenv("UPLOAD_RETRIES", "5"))  # per request, exponential backoff (googleapiclient)
+
+_local = threading.local()
+_creds = None
+
 def get_sheets():
+    """(sheet_id, service); one service per thread since the HTTP client is not thread-safe."""
+    global _creds
     sheet_id = os.getenv("GSHEET_ID")
     sa_path  = os.getenv("GOOGLE_SA_JSON_PATH")
     if not sheet_id or not sa_path:
         raise SystemExit("Missing GSHEET_ID or GOOGLE_SA_JSON_PATH in .env")
-    creds = Credentials.from_service_account_file(
-        sa_path,
-        scopes=["https://www.googleapis.com/auth/spreadsheets"]
-    )
-    return sheet_id, build("sheets", "v4", credentials=creds)
-
-def ensure_tab(svc, sheet_id: str, title: str):
-    meta = svc.spreadsheets().get(spreadsheetId=sheet_id).execute()
-    sheets = {s["properties"]["title"]: s["properties"]["sheetId"] for s in meta.get("sheets", [])}
-    if title in sheets:
-        return sheets[title]
-    # create the tab
-    req = {"requests": [{"addSheet": {"properties": {"title": title}}}]}
-    resp = svc.spreadsheets().batchUpdate(spreadsheetId=sheet_id, body=req).execute()
-    return resp["replies"][0]["addSheet"]["properties"]["sheetId"]
-
-def clear_tab(svc, sheet_id: str, title: str):
-    svc.spreadsheets().values().clear(
-        spreadsheetId=sheet_id,
-        range=f"{title}!A:Z"
-    ).execute()
+    if _creds is None:
+        _creds = Credentials.from_service_account_file(
+            sa_path,
+            scopes=["https://www.googleapis.com/auth/spreadsheets"]
+        )
+    if getattr(_local, "svc", None) is None:
+        _local.svc = build("sheets", "v4", credentials=_creds, cache_discovery=False)
+    return sheet_id, _local.svc
+
+def tab_ids(svc, sheet_id: str):
+    meta = svc.spreadsheets().get(spreadsheetId=sheet_id, fields="sheets.properties").execute(num_retries=RETRIES)
+    return {s["properties"]["title"]: s["properties"]["sheetId"] for s in meta.get("sheets", [])}
+
+VERSION_KEY = "etl_version"  # same per-tab version sheets_utils keys its snapshots on
+
+def bump_version(svc, sheet_id: str, tab_id: int):
+    """New etl_version on a tab we rewrote, so sheets_utils snapshots of it go stale."""
+    token = f"{time.time_ns():x}.{os.getpid()}"
+    lookup = {"developerMetadataLookup": {"metadataKey": VERSION_KEY, "metadataLocation": {"sheetId": tab_id}}}
+    resp = svc.spreadsheets().batchUpdate(spreadsheetId=sheet_id, body={"requests": [{"updateDeveloperMetadata": {
+        "dataFilters": [lookup], "developerMetadata": {"metadataValue": token}, "fields": "metadataValue"}}]}
+    ).execute(num_retries=RETRIES)
+    if not ((resp.get("replies") or [{}])[0].get("updateDeveloperMetadata") or {}).get("developerMetadata"):
+        svc.spreadsheets().batchUpdate(spreadsheetId=sheet_id, body={"requests": [{"createDeveloperMetadata": {
+            "developerMetadata": {"metadataKey": VERSION_KEY, "metadataValue": token,
+                                  "location": {"sheetId": tab_id}, "visibility": "DOCUMENT"}}}]}
+        ).execute(num_retries=RETRIES)
+
+def quoted(title: str) -> str:
+    return "'" + title.replace("'", "''") + "'"
+
+# ---- CSV streaming
+def scan_csv(path: str):
+    """One streaming pass: (rows, widest row, fingerprint of the file)."""
+    st = os.stat(path)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{st.st_size}:{st.st_mtime_ns}".encode())
+    rows = width = 0
+    with open_text(path, compression_of(path), mode="rt") as f:
+        for row in csv.reader(f):
+            rows += 1
+            width = max(width, len(row))
+    with open(path, "rb") as f:
+        h.update(f.read(1 << 16))
+    return rows, width, h.hexdigest()
 
-def read_csv(path: str) -> List[List[str]]:
-    with open(path, newline="", encoding="utf-8") as f:
-        return [row for row in csv.reader(f)]
+def iter_chunks(path: str, chunk_rows: int):
+    """(chunk index, first sheet row, rows) without holding more than one chunk."""
+    with open_text(path, compression_of(path), mode="rt") as f:
+        chunk, idx = [], 0
+        for row in csv.reader(f):
+            chunk.append(row)
+            if len(chunk) == chunk_rows:
+                yield idx, idx * chunk_rows + 1, chunk
+                chunk, idx = [], idx + 1
+        if chunk:
+            yield idx, idx * chunk_rows + 1, chunk
+
+# ---- resume checkpoint
+def _ckpt_path(title: str) -> Path:
+    return STATE_DIR / (hashlib.blake2b(title.encode("utf8"), digest_size=8).hexdigest() + ".json")
+
+def load_checkpoint(title: str):
+    try:
+        with open(_ckpt_path(title), encoding="utf8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+def save_checkpoint(title: str, ckpt: dict):
+    path = _ckpt_path(title)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf8") as fh:
+        json.dump(ckpt, fh)
+    os.replace(tmp, path)
+
+# ---- upload
+def _staging(svc, sheet_id, title, rows, width, fingerprint):
+    """Reuse the staging tab of an interrupted upload of the same file, else start a fresh one."""
+    ckpt = load_checkpoint(title)
+    tabs = tab_ids(svc, sheet_id)
+    if (ckpt and ckpt.get("fingerprint") == fingerprint and ckpt.get("chunk_rows") == CHUNK_ROWS
+            and tabs.get(ckpt.get("staging")) == ckpt.get("staging_id")):
+        print(f"{title}: resuming, {len(ckpt['done'])} chunk(s) already uploaded")
+        return ckpt
+    staging = f"{title}__staging"
+    reqs = [{"deleteSheet": {"sheetId": tabs[staging]}}] if staging in tabs else []
+    reqs.append({"addSheet": {"properties": {
+        "title": staging,
+        "gridProperties": {"rowCount": max(1, rows), "columnCount": max(1, width)},
+    }}})
+    resp = svc.spreadsheets().batchUpdate(spreadsheetId=sheet_id, body={"requests": reqs}).execute(num_retries=RETRIES)
+    ckpt = {"fingerprint": fingerprint, "chunk_rows": CHUNK_ROWS, "staging": staging,
+            "staging_id": resp["replies"][-1]["addSheet"]["properties"]["sheetId"], "done": []}
+    save_checkpoint(title, ckpt)
+    return ckpt
+
+def _send(staging: str, start_row: int, chunk):
+    sheet_id, svc = get_sheets()
+    svc.spreadsheets().values().update(
+        spreadsheetId=sheet_id,
+        range=f"{quoted(staging)}!A{start_row}",
+        valueInputOption="RAW",
+        body={"values": chunk}
+    ).execute(num_retries=RETRIES)
 
 def upload_csv(path: str, title: str):
     sheet_id, svc = get_sheets()
-    ensure_tab(svc, sheet_id, title)
-    clear_tab(svc, sheet_id, title)
-    rows = read_csv(path)
+    rows, width, fingerprint = scan_csv(path)
     if not rows:
         print(f"{title}: CSV empty, skipped.")
         return
-    # batch upload in chunks so we do not hit payload limits
-    BATCH = 10000
-    start_row = 1
-    for i in range(0, len(rows), BATCH):
-        chunk = rows[i:i+BATCH]
-        end_row = start_row + len(chunk) - 1
-        svc.spreadsheets().values().update(
-            spreadsheetId=sheet_id,
-            range=f"{title}!A{start_row}",
-            valueInputOption="RAW",
-            body={"values": chunk}
-        ).execute()
-        start_row = end_row + 1
-    print(f"Uploaded {len(rows)} rows to tab {title}.")
+    ckpt = _staging(svc, sheet_id, title, rows, width, fingerprint)
+    done = set(ckpt["done"])
+
+    # bounded in-flight chunks keep memory at ~WORKERS * CHUNK_ROWS rows
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        inflight = {}
+        def settle(futures):
+            for fut in futures:
+                idx = inflight.pop(fut)
+                fut.result()  # re-raise; the checkpoint keeps what already made it
+                done.add(idx)
+                ckpt["done"] = sorted(done)
+                save_checkpoint(title, ckpt)
+        try:
+            for idx, start_row, chunk in iter_chunks(path, CHUNK_ROWS):
+                if idx in done:
+                    continue
+                if len(inflight) >= WORKERS:
+                    finished, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                    settle(finished)
+                inflight[pool.submit(_send, ckpt["staging"], start_row, chunk)] = idx
+            settle(wait(inflight)[0])
+        except Exception:
+            # record whatever else finished before bailing out
+            finished = [f for f in list(inflight) if f.done() and not f.exception()]
+            settle(finished)
+            raise
+
+    # swap in one batchUpdate. An existing tab keeps its sheetId: clear its values, size it
+    # to the upload, paste the staging values in, drop staging. A new tab is staging renamed.
+    tabs = tab_ids(svc, sheet_id)
+    if title in tabs:
+        live, grid = tabs[title], {"startRowIndex": 0, "endRowIndex": rows,
+                                   "startColumnIndex": 0, "endColumnIndex": max(1, width)}
+        reqs = [
+            {"updateCells": {"range": {"sheetId": live}, "fields": "userEnteredValue"}},
+            {"updateSheetProperties": {
+                "properties": {"sheetId": live, "gridProperties": {"rowCount": rows, "columnCount": max(1, width)}},
+                "fields": "gridProperties(rowCount,columnCount)",
+            }},
+            {"copyPaste": {"source": {"sheetId": ckpt["staging_id"], **grid},
+                           "destination": {"sheetId": live, **grid},
+                           "pasteType": "PASTE_VALUES", "pasteOrientation": "NORMAL"}},
+            {"deleteSheet": {"sheetId": ckpt["staging_id"]}},
+        ]
+    else:
+        live = ckpt["staging_id"]
+        reqs = [{"updateSheetProperties": {
+            "properties": {"sheetId": live, "title": title},
+            "fields": "title",
+        }}]
+    svc.spreadsheets().batchUpdate(spreadsheetId=sheet_id, body={"requests": reqs}).execute(num_retries=RETRIES)
+    _ckpt_path(title).unlink(missing_ok=True)
+    try:
+        bump_version(svc, sheet_id, live)
+    except Exception as e:
+        print(f"{title}: tab version not bumped ({e}); sheets_utils snapshots may be stale")
+    print(f"Uploaded {rows} rows to tab {title}.")
+
+def existing(path: str):
+    """path, or its compressed variant written by raw_sink (the newest, as raw_sink.stable_path picks)."""
+    found = [c for c in (path, path + ".gz", path + ".zst") if os.path.exists(c)]
+    return max(found, key=os.path.getmtime) if found else None
 
 if __name__ == "__main__":
     import dotenv
     dotenv.load_dotenv()
 
     parser = argparse.ArgumentParser(description="Upload CSVs to Google Sheets tabs")
-    parser.add_argument("--raw-youtube", default="data/raw_youtube.csv")
-    parser.add_argument("--raw-reddit",  default="data/raw_reddit.csv")
+    parser.add_argument("--raw-youtube", default=None, help="default: the crawler's stable file (raw_sink.stable_path)")
+    parser.add_argument("--raw-reddit",  default=None, help="default: the crawler's stable file (raw_sink.stable_path)")
     parser.add_argument("--clean-all",   default="data/clean_all.csv")
     parser.add_argument("--skip-missing", action="store_true")
     args = parser.parse_args()
 
     files = [
-        (args.raw_youtube, "RAW_YOUTUBE"),
-        (args.raw_reddit,  "RAW_REDDIT"),
+        (args.raw_youtube or str(stable_path("youtube") or "data/raw_youtube.csv"), "RAW_YOUTUBE"),
+        (args.raw_reddit  or str(stable_path("reddit") or "data/raw_reddit.csv"),   "RAW_REDDIT"),
         (args.clean_all,   "CLEAN_ALL"),
     ]
 
     for path, tab in files:
-        if os.path.exists(path):
-            upload_csv(path, tab)
+        found = existing(path)
+        if found:
+            upload_csv(found, tab)
         else:
-            if args.skip-missing:
+            if args.skip_missing:
                 print(f"Missing {path}, skipped.")
             else:
                 print(f"Missing {path}. Create it or pass --skip-missing.")
@@ -1,32 +1,40 @@
-import re, json, datetime as dt
+import os, re, json, datetime as dt
+from scripts.keyword_matcher import KeywordMatcher, load_lexicon
+from scripts import text_quality
+
 BAD = {"idiot","stupid","trash","worst","hate","scam","cringe"}
 SIGNALS = {
  "launch","announcement","preorder","drop","collab","ugc","giveaway","challenge",
  "comment below","subscribe","link in bio","waitlist","cpm","cpc","roas","conversion","retarget",
  "short-form","reel","short","story","carousel","duet","stitch","brand deal","referral","limited time","discount","early access"
 }
+POS_WORDS = ["great","love","awesome","useful","works"]
+NEG_WORDS = ["hate","worst","useless","broken"]
+
+# every lexicon in one automaton; LEXICON_FILE (JSON {category: [phrases]}) extends it.
+# Sets are added sorted: phrase order ("lexicon order" of marketing_signals) must not follow the hash seed.
+LEXICON = KeywordMatcher({"signal": sorted(SIGNALS), "toxic": sorted(BAD), "pos": POS_WORDS, "neg": NEG_WORDS})
+if os.getenv("LEXICON_FILE"):
+    for _cat, _phrases in load_lexicon(os.getenv("LEXICON_FILE")).items():
+        LEXICON.add(_cat, _phrases)
 
 def is_english(text:str)->bool:
-    if not text: return False
-    ascii_ratio = sum(1 for ch in text if ord(ch)<128)/max(1,len(text))
-    return ascii_ratio > 0.95
+    return text_quality.is_english(text, 0.95)
 
 def toxicity(text:str)->float:
-    t = (text or "").lower()
-    return 0.6 if any(w in t for w in BAD) else 0.05
+    return 0.6 if LEXICON.match(text or "")["toxic"] else 0.05
 
 def sentiment(text:str)->float:
-    t = (text or "").lower()
-    if any(w in t for w in ["great","love","awesome","useful","works"]): return 0.7
-    if any(w in t for w in ["hate","worst","useless","broken"]): return -0.6
+    found = LEXICON.match(text or "")
+    if found["pos"]: return 0.7
+    if found["neg"]: return -0.6
     return 0.1
 
 def hashtags(text:str):
-    return list({m.lower() for m in re.findall(r"#\w+", text or "")})
+    return sorted({m.lower() for m in re.findall(r"#\w+", text or "")})
 
 def marketing_signals(text:str):
-    t = (text or "").lower()
-    return [s for s in SIGNALS if s in t]
+    return LEXICON.match(text or "")["signal"]
 
 def hours_since(ts_iso:str)->float:
     now = dt.datetime.utcnow().replace(tzinfo=dt.timezone.utc)
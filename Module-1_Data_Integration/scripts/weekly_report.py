@@ -10,7 +10,8 @@ from pathlib import Path
 import pandas as pd
 
 from reports_utils import date_window, plot_barh, plot_pie
-from sheets_utils import get_all_rows, append_row, write_rows
+from sheets_utils import append_row
+from sheet_frames import load_frames, TAB_SCHEMAS
 from slack_sender import send_text, send_file
 
 REPORTS_DIR = Path(os.getenv("REPORTS_DIR", "reports"))
@@ -20,40 +21,34 @@ TOPICS_SUMMARY_SHEET = os.getenv("TOPICS_SUMMARY_SHEET", "TOPICS_SUMMARY")
 SENTIMENT_SHEET = os.getenv("OUT_SHEET", "SENTIMENT")
 METRICS_WEEKLY = os.getenv("METRICS_WEEKLY_SHEET", "METRICS_WEEKLY")
 
-def read_topics_between(start, end):
-    rows = get_all_rows(TOPICS_SUMMARY_SHEET) or []
-    df = pd.DataFrame(rows)
-    if df.empty:
+def _between(df, start, end):
+    # keep all rows when the tab has no created_utc
+    if df.empty or 'created_utc' not in df.columns:
         return df
-    # assume there is 'created_utc' or similar; otherwise keep all
-    if 'created_utc' in df.columns:
-        df['created_utc'] = pd.to_datetime(df['created_utc'], errors='coerce', utc=True)
-        return df[(df['created_utc'] >= start) & (df['created_utc'] < end)]
-    return df
-
-def read_sentiment_between(start, end):
-    rows = get_all_rows(SENTIMENT_SHEET) or []
-    df = pd.DataFrame(rows)
-    if df.empty:
-        return df
-    if 'created_utc' in df.columns:
-        df['created_utc'] = pd.to_datetime(df['created_utc'], errors='coerce', utc=True)
-        return df[(df['created_utc'] >= start) & (df['created_utc'] < end)]
-    return df
+    return df[(df['created_utc'] >= start) & (df['created_utc'] < end)]
+
+def read_between(start, end):
+    """(topics, sentiment) for the window, both tabs fetched in one batch."""
+    frames = load_frames([TOPICS_SUMMARY_SHEET, SENTIMENT_SHEET], schemas={
+        TOPICS_SUMMARY_SHEET: TAB_SCHEMAS["TOPICS_SUMMARY"],
+        SENTIMENT_SHEET: TAB_SCHEMAS["SENTIMENT"],
+    })
+    return (_between(frames[TOPICS_SUMMARY_SHEET], start, end),
+            _between(frames[SENTIMENT_SHEET], start, end))
 
 def build_weekly(start, end):
     out_dir = REPORTS_DIR / f"{end.strftime('%Y-Week-%W')}"
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    topics = read_topics_between(start, end)
-    sent = read_sentiment_between(start, end)
+    topics, sent = read_between(start, end)
 
     # top topics (count)
     top_series = pd.Series(dtype=int)
     if not topics.empty and 'Name' in topics.columns:
         # if your topics summary uses Name / Topic columns adjust here
         name_col = 'Name' if 'Name' in topics.columns else ('topic_name' if 'topic_name' in topics.columns else 'topic')
-        top_series = topics[name_col].value_counts().head(20)
+        # categorical columns list every category; keep the ones seen this week
+        top_series = topics[name_col].value_counts().loc[lambda s: s > 0].head(20)
     else:
         top_series = pd.Series({}, dtype=int)
 
@@ -64,12 +59,12 @@ def build_weekly(start, end):
     # sentiment pie
     sent_counts = {}
     if not sent.empty and 'sentiment_label' in sent.columns:
-        sent_counts = sent['sentiment_label'].value_counts().to_dict()
+        sent_counts = sent['sentiment_label'].value_counts().loc[lambda s: s > 0].to_dict()
     else:
         # fallback if sentiment uses 'sentiment' or 'label'
         for c in ('sentiment','sentiment_label','sentiment_label'):
             if c in sent.columns:
-                sent_counts = sent[c].value_counts().to_dict()
+                sent_counts = sent[c].value_counts().loc[lambda s: s > 0].to_dict()
                 break
 
     sent_png = out_dir / "sentiment_pie.png"
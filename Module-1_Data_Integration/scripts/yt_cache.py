@@ -0,0 +1,95 @@
+# scripts/yt_cache.py
+"""
+On-disk response cache for YouTube Data API calls made through yt_get.
+Entries are keyed by endpoint + normalized params (API key excluded) and
+expire per endpoint, so same-day re-runs of the discovery streams cost no quota.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+
+CACHE_DIR = Path(os.getenv("YT_CACHE_DIR", "data/cache/youtube"))
+BYPASS    = os.getenv("YT_CACHE_BYPASS", "0") in ("1","true","True","yes","YES")
+
+# TTL in hours per endpoint; 0 disables caching for that endpoint
+TTL_HOURS = {
+    "videos:mostPopular": float(os.getenv("YT_CACHE_TTL_POPULAR_H", "6")),
+    "videos":             float(os.getenv("YT_CACHE_TTL_VIDEOS_H", "6")),
+    "search":             float(os.getenv("YT_CACHE_TTL_SEARCH_H", "24")),
+    "commentThreads":     float(os.getenv("YT_CACHE_TTL_COMMENTS_H", "0")),
+}
+
+def endpoint_of(path, params):
+    if path == "videos" and params.get("chart") == "mostPopular":
+        return "videos:mostPopular"
+    return path
+
+def cache_key(path, params):
+    norm = {k: str(v) for k, v in params.items() if k != "key" and v is not None}
+    blob = json.dumps([path, sorted(norm.items())], ensure_ascii=False)
+    return hashlib.sha1(blob.encode("utf8")).hexdigest()
+
+class ResponseCache:
+    def __init__(self, root=CACHE_DIR, ttl_hours=None, bypass=BYPASS):
+        self.root = Path(root)
+        self.ttl_hours = dict(TTL_HOURS if ttl_hours is None else ttl_hours)
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _ttl(self, endpoint):
+        return self.ttl_hours.get(endpoint, 0) * 3600
+
+    def _path(self, endpoint, key):
+        return self.root / endpoint.replace(":", "_") / f"{key}.json"
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, path, params):
+        """Return the cached response, or None on miss / expiry / bypass."""
+        endpoint = endpoint_of(path, params)
+        ttl = self._ttl(endpoint)
+        if ttl <= 0:
+            return None
+        if self.bypass:
+            self._count(False)
+            return None
+        fp = self._path(endpoint, cache_key(path, params))
+        try:
+            with open(fp, encoding="utf8") as fh:
+                entry = json.load(fh)
+        except (OSError, ValueError):
+            self._count(False)
+            return None
+        if time.time() - entry.get("fetched", 0) > ttl:
+            self._count(False)
+            return None
+        self._count(True)
+        return entry.get("data")
+
+    def put(self, path, params, data):
+        """Store a response (also when bypassing, so the next run is warm)."""
+        endpoint = endpoint_of(path, params)
+        if self._ttl(endpoint) <= 0:
+            return
+        fp = self._path(endpoint, cache_key(path, params))
+        fp.parent.mkdir(parents=True, exist_ok=True)
+        tmp = fp.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf8") as fh:
+            json.dump({"fetched": time.time(), "path": path, "data": data}, fh, ensure_ascii=False)
+        os.replace(tmp, fp)
+
+    def report(self):
+        total = self.hits + self.misses
+        rate = (self.hits / total) if total else 0.0
+        note = " (bypass)" if self.bypass else ""
+        return f"hits={self.hits} misses={self.misses} hit_rate={rate:.0%}{note}"
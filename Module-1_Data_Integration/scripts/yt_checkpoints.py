@@ -0,0 +1,65 @@
+# scripts/yt_checkpoints.py
+"""
+Per-video high-watermarks for incremental YouTube crawls.
+For every crawled video we keep a publishedAt watermark (every comment up to
+it has been fetched) and the most recent comment IDs, so the next run can page
+commentThreads by time, skip comments it already has and stop at the watermark.
+"""
+import os
+import json
+import datetime as dt
+from pathlib import Path
+
+CHECKPOINT_PATH = Path(os.getenv("YT_CHECKPOINTS", "data/state/yt_checkpoints.json"))
+MAX_KNOWN_IDS   = int(os.getenv("YT_CHECKPOINT_MAX_IDS", "500"))
+KEEP_DAYS       = int(os.getenv("YT_CHECKPOINT_TTL_DAYS", "30"))
+
+def _now_iso():
+    return dt.datetime.utcnow().isoformat("T") + "Z"
+
+class CheckpointStore:
+    def __init__(self, path=None):
+        self.path = Path(CHECKPOINT_PATH if path is None else path)
+        self.videos = {}
+        if self.path.exists():
+            try:
+                with open(self.path, encoding="utf8") as fh:
+                    self.videos = json.load(fh).get("videos", {})
+            except (OSError, ValueError):
+                print(f"[YT] checkpoint file {self.path} unreadable; starting cold")
+                self.videos = {}
+
+    def get(self, video_id):
+        """Return {'last_published', 'known_ids'} for a video, or None if never crawled."""
+        return self.videos.get(video_id)
+
+    def update(self, video_id, rows, complete=True):
+        """
+        Record freshly fetched comment rows. The watermark only moves when the
+        fetch reached it (complete); after a capped fetch it stays put and the
+        kept rows go to known_ids, so the next run skips them and picks up the
+        comments the cap left behind.
+        """
+        prev = self.videos.get(video_id) or {}
+        new_ids = [r.get("comment_id", "") for r in rows if r.get("comment_id")]
+        fresh = set(new_ids)
+        known = new_ids + [c for c in prev.get("known_ids", []) if c not in fresh]
+        newest = max([prev.get("newest", ""), prev.get("last_published", "")] + [r.get("created_utc", "") or "" for r in rows])
+        # a cold (relevance-ordered) crawl is a sample anyway, so it sets the watermark too
+        last = newest if complete or not prev else prev.get("last_published", "")
+        # replace (not mutate) so readers in other threads see a consistent entry
+        self.videos[video_id] = {
+            "last_published": last,
+            "newest": newest,  # newest comment kept; the watermark catches up on a complete fetch
+            "known_ids": known[:MAX_KNOWN_IDS],
+            "crawled_utc": _now_iso(),
+        }
+
+    def save(self):
+        cutoff = (dt.datetime.utcnow() - dt.timedelta(days=KEEP_DAYS)).isoformat("T") + "Z"
+        self.videos = {v: c for v, c in self.videos.items() if c.get("crawled_utc", "") >= cutoff}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf8") as fh:
+            json.dump({"videos": self.videos}, fh)
+        os.replace(tmp, self.path)
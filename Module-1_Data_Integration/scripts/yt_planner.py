@@ -0,0 +1,175 @@
+# scripts/yt_planner.py
+"""
+Quota-aware discovery planner for the YouTube crawler.
+
+Knows the unit cost of each Data API endpoint, dedupes region/category and
+keyword combinations, and spends a daily quota budget on the combinations
+that produced the most unique, high-comment videos in earlier runs.
+Unexplored combinations get an optimistic score so they are still tried.
+"""
+import os
+import json
+import math
+import threading
+import datetime as dt
+from pathlib import Path
+
+# https://developers.google.com/youtube/v3/determine_quota_cost
+UNIT_COST = {"videos": 1, "search": 100, "commentThreads": 1, "channels": 1}
+
+DAILY_QUOTA = int(os.getenv("YT_DAILY_QUOTA", "10000"))
+STATS_PATH  = Path(os.getenv("YT_PLANNER_STATS", "data/state/yt_discovery_stats.json"))
+REPORT_DIR  = Path(os.getenv("YT_QUOTA_REPORT_DIR", "data/state"))
+DECAY       = float(os.getenv("YT_PLANNER_DECAY", "0.7"))  # weight kept from older runs
+
+def popular_key(region, cat_id):
+    return f"popular|{region}|{cat_id}"
+
+def search_key(kw):
+    return f"search|{kw.lower()}"
+
+# ---------------- quota meter ----------------
+class QuotaMeter:
+    """Counts units actually spent (network calls only; cache hits are free)."""
+    def __init__(self):
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.calls = {}
+
+    def charge(self, path):
+        with self._lock:
+            self.calls[path] = self.calls.get(path, 0) + 1
+
+    def by_endpoint(self):
+        with self._lock:
+            return {p: n * UNIT_COST.get(p, 1) for p, n in self.calls.items()}
+
+    def units(self):
+        return sum(self.by_endpoint().values())
+
+# ---------------- history ----------------
+def load_stats(path=None):
+    path = STATS_PATH if path is None else path
+    try:
+        with open(path, encoding="utf8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+def save_stats(stats, path=None):
+    path = Path(STATS_PATH if path is None else path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf8") as fh:
+        json.dump(stats, fh, indent=1)
+    os.replace(tmp, path)
+
+def _score(entry):
+    return entry["value"] / entry["units"] if entry.get("units") else None
+
+# ---------------- planning ----------------
+def build_plan(regions, categories, keywords, popular_pages, search_pages,
+               budget=DAILY_QUOTA, reserve=0, stats=None):
+    """
+    categories: {name: category_id}; names sharing an id are planned once.
+    reserve:    units held back for commentThreads paging.
+    Returns {'items': [...], 'skipped': [...], 'budget', 'reserve', 'planned_units'}.
+    """
+    stats = load_stats() if stats is None else stats
+    combos, skipped, seen = [], [], set()
+
+    for region in regions:
+        for cat_name, cat_id in categories.items():
+            key = popular_key(region, cat_id)
+            if key in seen:
+                skipped.append({"key": key, "category": cat_name, "reason": "duplicate"})
+                continue
+            seen.add(key)
+            combos.append({"key": key, "stream": "popular", "region": region, "category": cat_name,
+                           "cat_id": cat_id, "pages": popular_pages,
+                           "cost": popular_pages * UNIT_COST["videos"]})
+    for kw in keywords:
+        key = search_key(kw)
+        if key in seen:
+            skipped.append({"key": key, "q": kw, "reason": "duplicate"})
+            continue
+        seen.add(key)
+        combos.append({"key": key, "stream": "marketing", "q": kw, "pages": search_pages,
+                       "cost": search_pages * UNIT_COST["search"]})
+
+    known = [s for s in (_score(stats[c["key"]]) for c in combos if c["key"] in stats) if s is not None]
+    explore = max(known) if known else 1.0
+    for c in combos:
+        s = _score(stats[c["key"]]) if c["key"] in stats else None
+        c["score"] = round(explore if s is None else s, 4)
+        c["explored"] = s is not None
+
+    left = max(0, budget - reserve)
+    items = []
+    for c in sorted(combos, key=lambda c: c["score"], reverse=True):
+        if c["cost"] <= left:
+            items.append(c)
+            left -= c["cost"]
+        else:
+            skipped.append({"key": c["key"], "reason": "budget", "cost": c["cost"], "score": c["score"]})
+
+    return {
+        "budget": budget,
+        "reserve": reserve,
+        "planned_units": sum(c["cost"] for c in items),
+        "items": items,
+        "skipped": skipped,
+    }
+
+def record_run(plan, cands, selected, fetched_counts, units=None, stats=None):
+    """
+    Fold this run's yield into the history. A video counts for the combination
+    that found it first (meta['combo']); its value is log1p(comments fetched)
+    when it was selected, the same measure for both streams (search results
+    carry no real comment count). units: {combo key: units actually spent};
+    without it the planned cost is recorded.
+    """
+    stats = load_stats() if stats is None else stats
+    run = {c["key"]: {"units": c["cost"] if units is None else units.get(c["key"], 0),
+                      "unique": 0, "selected": 0, "value": 0.0} for c in plan["items"]}
+    picked = set(selected)
+    for vid, meta in cands.items():
+        r = run.get(meta.get("combo"))
+        if r is None:
+            continue
+        r["unique"] += 1
+        if vid in picked:
+            r["selected"] += 1
+            r["value"] += math.log1p(max(0, fetched_counts.get(vid, 0)))
+    for key, r in run.items():
+        old = stats.get(key, {"units": 0, "unique": 0, "selected": 0, "value": 0.0, "runs": 0})
+        stats[key] = {k: old.get(k, 0) * DECAY + r[k] for k in ("units", "unique", "selected", "value")}
+        stats[key]["runs"] = old.get("runs", 0) + 1
+    save_stats(stats)
+    return run
+
+def quota_report(plan, meter, cands, selected, cache_hits=0):
+    """One-line summary of the run's spend; with a plan (YT_PLANNER) also writes data/state/yt_quota_<date>.json."""
+    spent = meter.by_endpoint()
+    total = sum(spent.values())
+    report = {
+        "date": dt.datetime.utcnow().strftime("%Y-%m-%d"),
+        "budget": plan["budget"] if plan else DAILY_QUOTA,
+        "planned_discovery_units": plan["planned_units"] if plan else None,
+        "spent_units": total,
+        "spent_by_endpoint": spent,
+        "cache_hits": cache_hits,
+        "candidates": len(cands),
+        "selected": len(selected),
+        "candidates_per_unit": round(len(cands) / total, 3) if total else None,
+        "skipped": plan["skipped"] if plan else [],
+    }
+    if plan:
+        REPORT_DIR.mkdir(parents=True, exist_ok=True)
+        with open(REPORT_DIR / f"yt_quota_{report['date']}.json", "w", encoding="utf8") as fh:
+            json.dump(report, fh, indent=1)
+    parts = " ".join(f"{p}={u}" for p, u in sorted(spent.items()))
+    return f"spent={total}/{report['budget']} units ({parts or 'none'}) | candidates/unit={report['candidates_per_unit']}"